@@ -18,7 +18,7 @@ from pathlib import Path
 # Ensure backend src is on path when run as script
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from src.services.email_ingestion.client import EmailClient
+from src.services.email_ingestion.client import get_email_client
 from src.services.email_ingestion.parsers import parser_registry
 from src.services.email_ingestion.parsers.base import BaseAlertParser
 from src.services.database_manager.operations.account_operations import AccountOperations
@@ -78,7 +78,7 @@ async def validate(date_from: date, date_to: date, account_filter: str | None):
             print(f"  [WARN] No parser for account '{nickname}', skipping.")
             continue
 
-        email_client = EmailClient(account_id="primary")
+        email_client = get_email_client("primary")
         since = datetime.combine(date_from, datetime.min.time())
         # Gmail `before:` is exclusive — add 1 day to include date_to itself
         until = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
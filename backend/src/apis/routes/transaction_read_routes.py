@@ -17,7 +17,7 @@ from src.apis.schemas.transactions import TransferSuggestion
 from src.services.cloud_storage.gcs_service import GoogleCloudStorageService
 from src.services.database_manager.connection import get_session_factory
 from src.services.database_manager.operations import CategoryOperations, SuggestionOperations, TagOperations, TransactionOperations
-from src.services.email_ingestion.client import EmailClient
+from src.services.email_ingestion.client import get_email_client
 from src.utils.db_utils import handle_database_operation
 from src.utils.logger import get_logger
 from src.utils.settings import get_settings
@@ -900,7 +900,7 @@ async def search_transaction_emails(
         # Search primary account
         try:
             logger.info("Searching primary Gmail account")
-            primary_client = EmailClient(account_id="primary")
+            primary_client = get_email_client("primary")
             primary_emails = primary_client.search_emails_for_transaction(
                 transaction_date=str(transaction["transaction_date"]),
                 transaction_amount=float(transaction["amount"]),
@@ -925,7 +925,7 @@ async def search_transaction_emails(
             settings = get_settings()
             if settings.GOOGLE_REFRESH_TOKEN_2:
                 logger.info("Searching secondary Gmail account")
-                secondary_client = EmailClient(account_id="secondary")
+                secondary_client = get_email_client("secondary")
                 secondary_emails = secondary_client.search_emails_for_transaction(
                     transaction_date=str(transaction["transaction_date"]),
                     transaction_amount=float(transaction["amount"]),
@@ -979,7 +979,7 @@ async def get_email_details(transaction_id: str, message_id: str):
 
         # Try primary account first
         try:
-            primary_client = EmailClient(account_id="primary")
+            primary_client = get_email_client("primary")
             email_content = primary_client.get_email_content(message_id)
             logger.info("Email message_id=%s found in primary account", message_id)
         except Exception as e:
@@ -990,7 +990,7 @@ async def get_email_details(transaction_id: str, message_id: str):
             try:
                 settings = get_settings()
                 if settings.GOOGLE_REFRESH_TOKEN_2:
-                    secondary_client = EmailClient(account_id="secondary")
+                    secondary_client = get_email_client("secondary")
                     email_content = secondary_client.get_email_content(message_id)
                     logger.info("Email message_id=%s found in secondary account", message_id)
             except Exception as e2:
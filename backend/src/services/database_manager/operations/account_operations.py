@@ -208,6 +208,44 @@ class AccountOperations:
             row = result.fetchone()
             return {"id": row[0], "nickname": row[1]} if row else None
 
+    @staticmethod
+    async def get_account_nicknames_by_senders(sender_emails: List[str]) -> dict[str, Optional[str]]:
+        """Resolve many statement senders to account nicknames with a single query.
+
+        Uses the same rules as ``get_account_by_sender_email``: an exact match on
+        ``statement_sender`` wins, otherwise the first account whose
+        (comma-separated) ``statement_sender`` contains the address. Senders with
+        no matching account map to ``None``.
+        """
+        if not sender_emails:
+            return {}
+        session_factory = get_session_factory()
+        async with session_factory() as session:
+            result = await session.execute(
+                text("""
+                    SELECT statement_sender, nickname FROM accounts
+                    WHERE statement_sender IS NOT NULL
+                    AND statement_sender != ''
+                    AND is_active = true
+                """)
+            )
+            rows = result.fetchall()
+
+        exact = {}
+        for statement_sender, nickname in rows:
+            exact.setdefault(statement_sender, nickname)
+
+        nicknames: dict[str, Optional[str]] = {}
+        for sender_email in sender_emails:
+            if sender_email in exact:
+                nicknames[sender_email] = exact[sender_email]
+                continue
+            nicknames[sender_email] = next(
+                (nickname for statement_sender, nickname in rows if sender_email in statement_sender),
+                None,
+            )
+        return nicknames
+
     @staticmethod
     async def get_all_statement_senders() -> List[str]:
         """Get all unique statement sender emails from active accounts"""
@@ -5,7 +5,7 @@ from typing import Any, Dict, List, Optional
 
 from src.services.database_manager.operations.account_operations import AccountOperations
 from src.services.database_manager.operations.transaction_operations import TransactionOperations
-from src.services.email_ingestion.client import EmailClient
+from src.services.email_ingestion.client import get_email_client
 from src.services.email_ingestion.dedup_service import DeduplicationService
 from src.services.email_ingestion.parsers import parser_registry
 from src.utils.logger import get_logger
@@ -133,7 +133,7 @@ class AlertIngestionService:
             watermark = lp if isinstance(lp, datetime) else None
 
         try:
-            email_client = EmailClient(account_id="primary")
+            email_client = get_email_client("primary")
             days_back = 7 if not watermark else None
             messages = email_client.list_recent_alert_emails(
                 max_results=200,
@@ -155,6 +155,15 @@ class AlertIngestionService:
             message_ids
         )
 
+        # Fetch the new messages concurrently off the event loop; failures are
+        # logged by the client and show up here as missing entries.
+        pending_ids = [mid for mid in message_ids if mid not in existing_ids]
+        try:
+            contents = await email_client.get_email_contents_async(pending_ids)
+        except Exception:
+            logger.error("Failed to fetch email contents for %s", nickname, exc_info=True)
+            contents = {}
+
         for message in messages:
             msg_id = message.get("id")
             if not msg_id:
@@ -165,8 +174,11 @@ class AlertIngestionService:
                 continue
 
             processed += 1
+            content = contents.get(msg_id)
+            if content is None:
+                errors += 1
+                continue
             try:
-                content = email_client.get_email_content(msg_id)
                 parsed = None
                 for p in parsers:
                     parsed = p.parse(content)
@@ -1,17 +1,32 @@
 from __future__ import annotations
 
 import asyncio
-import base64
+import binascii
+import calendar
+import copy
 import json
 import math
+import os
 import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from html import unescape
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
 
+import httplib2
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 
 from src.services.database_manager.operations import AccountOperations
 from src.services.email_ingestion.token_manager import TokenManager
@@ -28,39 +43,612 @@ except ImportError:
     HAS_BS4 = False
     logger.warning("BeautifulSoup4 not available, using regex for HTML parsing")
 
+# lxml's C parser is the next best option for plain-text extraction
+try:
+    import lxml.html
+    from lxml import etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# orjson parses Gmail's JSON responses (format=full bodies run to tens of KB) ~2x faster
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# _html_to_text. CSS @-rules (with one level of nested braces) that leak into text,
+# then bare @-rule prefixes; one alternation so the text is walked once.
+_CSS_AT_RULE_BLOCK = r'@[a-z-]+\s*[^{]*\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}'
+_CSS_AT_RULE_PREFIX = r'@media\s+[^{]*|@font-face\s*|@[a-z-]+\s+'
+_CSS_AT_RULE_RE = re.compile(f'{_CSS_AT_RULE_BLOCK}|{_CSS_AT_RULE_PREFIX}', re.DOTALL | re.IGNORECASE)
+# Regex fallback, two passes: first the non-visible elements with their content
+# (so their braces can't anchor an @-rule match), then inline styles, CSS
+# @-rules and every remaining tag
+_HTML_HIDDEN_ELEMENTS_RE = re.compile(
+    r'<style[^>]*>.*?</style>|<script[^>]*>.*?</script>|<noscript[^>]*>.*?</noscript>|<link[^>]*>',
+    re.DOTALL | re.IGNORECASE,
+)
+_HTML_MARKUP_RE = re.compile(
+    r'style\s*=\s*["\'][^"\']*["\']'
+    f'|{_CSS_AT_RULE_BLOCK}|{_CSS_AT_RULE_PREFIX}'
+    r'|<[^>]+>',
+    re.DOTALL | re.IGNORECASE,
+)
+_STYLE_TAG_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+_HORIZONTAL_SPACE_RE = re.compile(r'[ \t]+')
+# Marks a single-part body as an HTML document; matched case-insensitively in
+# place instead of lowercasing a copy of the whole body
+_HTML_DOCUMENT_MARKER_RE = re.compile(r'<(?:html|body)', re.IGNORECASE)
+
+# Uber receipts
+_AMOUNT_DIGITS_RE = re.compile(r'[\d,]+\.?\d*')
+_UBER_TOTAL_RE = re.compile(r'Total\s*(?:Fare|:)?\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', re.I)
+_UBER_TOTAL_FALLBACK_RE = re.compile(r'Total\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', re.I)
+_UBER_TIME_RE = re.compile(r'(\d{1,2}:\d{2}\s*(?:AM|PM)?)', re.I)
+_UBER_DISTANCE_RE = re.compile(r'(\d+\.?\d*)\s*(kilometres|km)', re.I)
+_UBER_DURATION_RE = re.compile(r'(\d+)\s*(min|min\.|minutes)', re.I)
+# Vehicle types, ordered by specificity (first match wins)
+_UBER_VEHICLE_PATTERNS = [
+    (re.compile(r'\bUber\s*Premier\b', re.I), 'Uber Premier'),
+    (re.compile(r'\bUber\s*XL\b', re.I), 'Uber XL'),
+    (re.compile(r'\bUber\s*Go\s*Sedan\b', re.I), 'Uber Go Sedan'),
+    (re.compile(r'\bUber\s*Go\b', re.I), 'Uber Go'),
+    (re.compile(r'\bUber\s*Auto\b', re.I), 'Auto'),
+    (re.compile(r'\bAuto\b', re.I), 'Auto'),
+    (re.compile(r'\bMoto\b', re.I), 'Moto'),
+    (re.compile(r'\bUber\s*X\b', re.I), 'Uber X'),
+    (re.compile(r'\bUber\s*Intercity\b', re.I), 'Uber Intercity'),
+    (re.compile(r'\bSedan\b', re.I), 'Sedan'),  # Generic fallback
+]
+
+# Text near a time stamp that is never a pickup/drop address (casefolded)
+_UBER_SKIP_PHRASES = frozenset({
+    'thanks for riding', 'total', 'fare', 'switch payment',
+    'download', 'help', 'support', 'rate or tip', 'uber one',
+    'license plate', 'trip details',
+})
+# Row labels in the Uber fare breakdown table (casefolded)
+_UBER_FARE_KEYWORDS = frozenset({
+    'base fare', 'distance', 'time', 'subtotal', 'booking fee',
+    'promotion', 'tolls', 'taxes', 'rounding', 'wait time',
+    'cancellation fee', 'access fee', 'surge', 'insurance',
+    'suggested fare', 'trip fare', 'ride fare',
+})
+# Each phrase set as one alternation, so a candidate is checked in a single
+# regex scan instead of one substring scan per phrase
+_UBER_SKIP_PHRASES_RE = re.compile('|'.join(map(re.escape, sorted(_UBER_SKIP_PHRASES))))
+_UBER_FARE_KEYWORDS_RE = re.compile('|'.join(map(re.escape, sorted(_UBER_FARE_KEYWORDS))))
+
+# Address text after a "Deliver To:" label, up to the next "Order" or 500 chars.
+# The tempered, bounded token keeps the scan linear on long container text.
+_DELIVER_TO_ADDR_RE = re.compile(r'Deliver\w*\s+To:\s*((?:(?!\s*Order)[^\n]){1,500})', re.I)
+
+# "Saturday, March 8, 2025 8:15 PM" in Swiggy order mails. Weekday names share
+# the "day," suffix, and matching is case-sensitive (the templates are always
+# title-case) so the engine can reject most positions on the first character.
+_WEEKDAY_DATETIME_RE = re.compile(
+    r'\b(?:Mon|Tues|Wednes|Thurs|Fri|Satur|Sun)day,\s+([A-Z][a-z]+\s+\d{1,2},\s+\d{4})\s+(\d{1,2}:\d{2}\s*(?:AM|PM|am|pm)?)'
+)
+
+# Label lookups for soup.find(string=...) in the Swiggy parser
+_ORDER_JOURNEY_LABEL_RE = re.compile(r'^\s*ORDER JOURNEY\s*$', re.I)
+_RESTAURANT_LABEL_RE = re.compile(r'^\s*Restaurant\s*$', re.I)
+_GRAND_TOTAL_LABEL_RE = re.compile(r'Grand\s*Total', re.I)
+_DELIVER_TO_LABEL_RE = re.compile(r'Deliver\w*\s+To:', re.I)
+_BILL_DETAILS_LABEL_RE = re.compile(r'Bill\s*Details', re.I)
+_ITEM_NAME_HEADER_RE = re.compile(r'Item\s+Name', re.I)
+
+# Text patterns in the Swiggy parser
+_RUPEE_AMOUNT_RE = re.compile(r'₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)')
+# Fallback amount patterns, most specific first
+_SWIGGY_AMOUNT_RES = tuple(re.compile(pattern, re.I) for pattern in (
+    r'Grand\s*Total[:\s]+₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
+    r'Order Total[:\s]+₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
+    r'Paid\s+Via\s+[^\n₹]*₹\s*(\d+(?:,\d+)*(?:\.\d{2})?)',  # New layout: "Paid Via Credit/Debit card ₹485.00"
+    r'payment of Rs\.\s*(\d+(?:,\d+)*)',  # Swiggy Dineout pattern
+    r'₹\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
+    r'Rs\.?\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
+))
+_SWIGGY_ORDER_ID_RE = re.compile(r'Order\s*(?:#|No\.?|ID)?[:\s]*(\d+)', re.I)
+# Bold ORDER JOURNEY cells that are times / order numbers rather than the restaurant
+_NOT_RESTAURANT_NAME_RE = re.compile(r'\d{1,2}:\d{2}|No\.|^\d')
+_DINEOUT_RESTAURANT_RE = re.compile(r'at\s+([A-Z][A-Za-z\s&\'-]+?)\s+was\s+completed')
+_DINEOUT_PAID_TO_RE = re.compile(r'Paid\s+to:\s*([^,]+)', re.I)
+_DINEOUT_PAID_TO_LINE_RE = re.compile(r'Paid\s+to:\s*(.*?)(?:\s+Here\s+are\s+the\s+details|\n|$)', re.I)
+_DINEOUT_SAVINGS_RE = re.compile(r'You saved Rs\.\s*(\d+(?:,\d+)*)', re.I)
+_DINEOUT_DINERS_RE = re.compile(r'for\s+(\d+)\s+(?:people|diners)', re.I)
+_DIGIT_RE = re.compile(r'\d')
+_FIRST_NUMBER_RE = re.compile(r'(\d+)')
+# Raw-HTML patterns for the no-BeautifulSoup fallback
+_SWIGGY_RESTAURANT_H5_RE = re.compile(r'Restaurant\s*</p>\s*<h5[^>]*>([^<]+)</h5>', re.I)
+_SWIGGY_GRAND_TOTAL_ROW_RE = re.compile(r'class="grand-total"[^>]*>.*?<td[^>]*>\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', re.I | re.DOTALL)
+_SWIGGY_GRAND_TOTAL_TEXT_RE = re.compile(r'Grand\s*Total.*?₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', re.I | re.DOTALL)
+
+
+def _is_deliver_to_label(text: Optional[str]) -> bool:
+    """soup.find predicate for "Deliver To:" labels; ':' is checked first so most strings skip the regex."""
+    return bool(text) and ':' in text and _DELIVER_TO_LABEL_RE.search(text) is not None
+
+
+# Instamart item cells look like "2 x Amul Taaza Milk"
+_INSTAMART_ITEM_RE = re.compile(r'^(\d+)\s*x\s+(.+)$', re.I)
+# Tables containing any of these are order summaries, not item lists
+_INSTAMART_SUMMARY_RE = re.compile(r'grand total|item bill|handling fee|delivery partner fee', re.I)
+# Food-delivery bill rows (Item Total, Platform Fee, GST, ...) that aren't dishes.
+# Whole-word match so dishes like "Cold Coffee" aren't mistaken for a "fee" row.
+_COST_KEYWORDS_RE = re.compile(
+    r'\b(?:total|subtotal|fees?|discounts?|tax(?:es)?|paid|packaging|delivery|applied|charges?|[cs]?gst|igst)\b',
+    re.I,
+)
+
+# Date formats: ISO dates from the API layer, and the YYYY/MM/DD form Gmail's
+# after:/before: search operators expect
+_ISO_DATE_FMT = "%Y-%m-%d"
+_GMAIL_DATE_FMT = "%Y/%m/%d"
+
+# A literal year 0000 in a Date header (not a +0000 zone offset); never a real date
+_ZERO_YEAR_RE = re.compile(r'(?<![+\-\d])0000(?!\d)')
+# Lowercase + spaces to underscores for ASCII account nicknames
+_LOWER_UNDERSCORE = str.maketrans({' ': '_', **{c: c.lower() for c in string.ascii_uppercase}})
+_MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12,
+}
+
+# Sub-requests per Gmail batch call (the API allows 100, but recommends <= 50
+# to stay clear of per-user rate limits)
+_GMAIL_BATCH_SIZE = 50
+
+# Largest page messages.list() will return
+_GMAIL_PAGE_SIZE = 500
+# Socket timeout (seconds) for Gmail connections, so a stalled connection can't pin a worker thread
+_GMAIL_HTTP_TIMEOUT = 30
+
+# Headers requested when a listing only needs to show who/what/when
+_LISTING_HEADERS = ["Subject", "From", "Date"]
+# Partial-response mask for those listings: drops labels, sizes and MIME structure
+_LISTING_FIELDS = "id,snippet,payload/headers"
+
+# How long a cached search_emails_by_date_range() listing stays valid (seconds)
+_SEARCH_CACHE_TTL = 300
+# Cached listings kept per client; the least recently used is dropped first
+_SEARCH_CACHE_SIZE = 256
+
+# Merchant detection: name -> type and the subject substrings that identify it
+_MERCHANTS = {
+    'uber': {'type': 'ride_sharing', 'patterns': ['uber']},
+    'ola': {'type': 'ride_sharing', 'patterns': ['ola', 'olacabs']},
+    'swiggy': {'type': 'food_delivery', 'patterns': ['swiggy', 'instamart']},
+    'zomato': {'type': 'food_delivery', 'patterns': ['zomato']},
+    'amazon': {'type': 'ecommerce', 'patterns': ['amazon']},
+    'flipkart': {'type': 'ecommerce', 'patterns': ['flipkart']},
+    'bigbasket': {'type': 'ecommerce', 'patterns': ['bigbasket']},
+    'myntra': {'type': 'ecommerce', 'patterns': ['myntra']},
+    'paytm': {'type': 'other', 'patterns': ['paytm']},
+    'phonepe': {'type': 'other', 'patterns': ['phonepe']},
+}
+_MERCHANT_ORDER_ID_RE = re.compile(r'(?:Order|Transaction|Trip|Booking)\s*(?:#|ID|No\.?)?[:\s]*([A-Z0-9-]+)', re.I)
+
+
+# Long-lived event loop on a daemon thread for running DB coroutines from sync
+# code, so each filename lookup doesn't create and tear down its own loop.
+_BACKGROUND_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_BACKGROUND_LOOP_LOCK = threading.Lock()
+# Upper bound on how long a sync caller waits for a background coroutine (seconds)
+_BACKGROUND_CALL_TIMEOUT = 5
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting its thread on first use."""
+    global _BACKGROUND_LOOP
+    with _BACKGROUND_LOOP_LOCK:
+        if _BACKGROUND_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="email-client-loop", daemon=True).start()
+            _BACKGROUND_LOOP = loop
+        return _BACKGROUND_LOOP
+
+
+def _run_coroutine_sync(coro, timeout: float = _BACKGROUND_CALL_TIMEOUT):
+    """
+    Run a coroutine on the background loop and block for its result.
+
+    Safe to call from a thread that is running some other event loop (that
+    loop is merely blocked until the result arrives), but not from the
+    background loop itself: the coroutine could never be scheduled, so that
+    case raises instead of deadlocking until the timeout.
+    """
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("Cannot block on the email client's background loop from inside it; await the async variant instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=timeout)
+
+
+# sender_email -> (monotonic time stored, nickname). Account nicknames rarely
+# change, so lookups are served from memory for _NICKNAME_CACHE_TTL seconds.
+_NICKNAME_CACHE: dict[str, Tuple[float, str]] = {}
+_NICKNAME_CACHE_LOCK = threading.Lock()
+_NICKNAME_CACHE_TTL = 1800
+
+
+def _cached_account_nickname(sender_email: str) -> Optional[str]:
+    """Cached nickname for a sender, or None if absent or older than _NICKNAME_CACHE_TTL."""
+    with _NICKNAME_CACHE_LOCK:
+        cached = _NICKNAME_CACHE.get(sender_email)
+    if cached and time.monotonic() - cached[0] < _NICKNAME_CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def _remember_account_nickname(sender_email: str, nickname: Optional[str]) -> None:
+    # Only hits are cached so a newly added account is picked up on the next call
+    if nickname:
+        with _NICKNAME_CACHE_LOCK:
+            _NICKNAME_CACHE[sender_email] = (time.monotonic(), nickname)
+
+
+# (account_id, message_id) -> parsed get_email_content() result without
+# raw_message, least recently used first. Gmail messages never change, so
+# entries need no expiry. raw_message (which carries inline attachment payloads)
+# is left out so the cache stays small; cache hits don't include it. Messages
+# whose attachments carry inline_data aren't cached at all: the payload would
+# pin up to MBs per entry, and a copy without it couldn't be downloaded.
+_CONTENT_CACHE: "OrderedDict[Tuple[str, str], dict[str, Any]]" = OrderedDict()
+_CONTENT_CACHE_LOCK = threading.Lock()
+_CONTENT_CACHE_SIZE = 128
+
+
+def _cached_email_content(account_id: str, message_id: str) -> Optional[dict[str, Any]]:
+    """Deep copy of a cached parsed message, or None; callers may mutate it freely."""
+    key = (account_id, message_id)
+    with _CONTENT_CACHE_LOCK:
+        content = _CONTENT_CACHE.get(key)
+        if content is None:
+            return None
+        _CONTENT_CACHE.move_to_end(key)
+    return copy.deepcopy(content)
+
+
+def _remember_email_content(account_id: str, message_id: str, content: dict[str, Any]) -> None:
+    if any(attachment.get("inline_data") for attachment in content.get("attachments", ())):
+        return
+    # Deep-copied so later changes to the caller's attachments/headers don't reach the cache
+    cached = copy.deepcopy({key: value for key, value in content.items() if key != "raw_message"})
+    with _CONTENT_CACHE_LOCK:
+        _CONTENT_CACHE[(account_id, message_id)] = cached
+        _CONTENT_CACHE.move_to_end((account_id, message_id))
+        while len(_CONTENT_CACHE) > _CONTENT_CACHE_SIZE:
+            _CONTENT_CACHE.popitem(last=False)
+
+
+def _lookup_account_nicknames(sender_emails: Iterable[str]) -> dict[str, Optional[str]]:
+    """
+    Account nicknames for statement senders, cached for _NICKNAME_CACHE_TTL seconds.
+
+    Senders missing from the cache are resolved together in one DB query.
+    """
+    nicknames: dict[str, Optional[str]] = {}
+    missing: List[str] = []
+    for sender_email in dict.fromkeys(sender_emails):
+        nickname = _cached_account_nickname(sender_email)
+        if nickname is None:
+            missing.append(sender_email)
+        else:
+            nicknames[sender_email] = nickname
+
+    if missing:
+        fetched = _run_coroutine_sync(AccountOperations.get_account_nicknames_by_senders(missing))
+        for sender_email in missing:
+            nickname = fetched.get(sender_email)
+            _remember_account_nickname(sender_email, nickname)
+            nicknames[sender_email] = nickname
+    return nicknames
+
+
+def _lookup_account_nickname(sender_email: str) -> Optional[str]:
+    """Account nickname for a single statement sender (see _lookup_account_nicknames)."""
+    return _lookup_account_nicknames((sender_email,))[sender_email]
+
+
+# Encoded characters decoded per step when streaming an attachment (multiple of 4)
+_B64_DECODE_CHUNK = 1 << 20
+
+# Attachment payloads may be any contiguous bytes-like object; a caller that
+# reuses a bytearray (or slices one via memoryview) is written without a copy.
+_BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class _TempFileOpenError(FileNotFoundError):
+    """_write_file couldn't create its temp file (missing directory); nothing was read from data."""
+
+
+def _write_file(path, data: Union[_BytesLike, Iterable[_BytesLike]]) -> int:
+    """
+    Atomically create/replace ``path`` with ``data`` using unbuffered os.write calls.
+
+    ``data`` is either one bytes-like object or an iterable of chunks, which
+    are written as they arrive. The bytes go to a temp file next to ``path``,
+    unique to this process and thread, and are renamed into place, so a crash
+    never leaves a truncated attachment behind and concurrent writers of the
+    same path don't share a temp file.
+    Returns the number of bytes written. A missing directory is reported as
+    _TempFileOpenError before any chunk is consumed, so only then is a retry
+    with the same ``data`` safe.
+    """
+    path = os.fspath(path)
+    head, name = os.path.split(path)
+    tmp_path = os.path.join(head, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    chunks = (data,) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    except FileNotFoundError as exc:
+        raise _TempFileOpenError(exc.errno, exc.strerror, tmp_path) from exc
+    total = 0
+    try:
+        try:
+            for chunk in chunks:
+                view = memoryview(chunk).cast("B")
+                written = 0
+                while written < len(view):
+                    written += os.write(fd, view[written:])
+                total += written
+            if hasattr(os, "posix_fadvise"):
+                # Statements are read once later; don't let them crowd the page cache
+                os.posix_fadvise(fd, 0, total, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return total
+
+
+_B64URL_TO_STD = bytes.maketrans(b"-_", b"+/")
+
+
+def _b64url_decode(data: str) -> bytes:
+    """Decode Gmail's base64url ``data``, restoring padding Gmail sometimes strips."""
+    raw = data.encode("ascii").translate(_B64URL_TO_STD)
+    return binascii.a2b_base64(raw + b"=" * (-len(raw) % 4))
+
+
+def _b64url_decode_text(data: str) -> str:
+    """Decode a base64url message body part to text, dropping undecodable bytes."""
+    return _b64url_decode(data).decode("utf-8", errors="ignore")
+
+
+def _b64url_decode_chunks(data: str, chunk_size: int = _B64_DECODE_CHUNK) -> Iterator[bytes]:
+    """Decode base64url ``data`` piecewise; ``chunk_size`` must be a multiple of 4."""
+    for start in range(0, len(data), chunk_size):
+        # Only the final piece can be short; _b64url_decode restores its padding
+        yield _b64url_decode(data[start:start + chunk_size])
+
+
+# Download directories already created by this process; skips a mkdir syscall per attachment
+_CREATED_DIRS: set[str] = set()
+
+
+def _ensure_dir(path: str, force: bool = False) -> None:
+    """mkdir -p ``path`` once per process (``force`` re-creates it, e.g. after external removal)."""
+    if path in _CREATED_DIRS and not force:
+        return
+    os.makedirs(path, exist_ok=True)
+    _CREATED_DIRS.add(path)
+
+
+def _fast_rfc2822_stamp(email_date: str) -> Optional[str]:
+    """
+    YYYYMMDD from the "[Tue, ]4 Mar 2025 ..." prefix of an RFC 2822 date.
+
+    Only the calendar date is needed for filenames, so the day/month/year
+    tokens are read directly; returns None when they don't look right.
+    """
+    parts = email_date.split(None, 4)
+    if parts and parts[0].endswith(','):
+        parts = parts[1:]
+    if len(parts) < 3:
+        return None
+    day, month, year = parts[0], _MONTHS.get(parts[1]), parts[2]
+    if month is None or not day.isdecimal() or len(year) != 4 or not year.isdecimal() or year == "0000":
+        return None
+    if not 1 <= int(day) <= calendar.monthrange(int(year), month)[1]:
+        return None
+    return f"{year}{month:02d}{int(day):02d}"
+
+
+@lru_cache(maxsize=1024)
+def _email_date_stamp(email_date: str) -> Optional[str]:
+    """YYYYMMDD for an email Date header, or None if it can't be parsed."""
+    if not isinstance(email_date, str):
+        return None
+    stamp = _fast_rfc2822_stamp(email_date)
+    if stamp:
+        return stamp
+    # Less common shapes (two-digit years, obsolete zone names, ...). parsedate
+    # would read the invalid year "0000" as 2000, so reject it like the fast path.
+    if _ZERO_YEAR_RE.search(email_date):
+        return None
+    try:
+        parsed_date = parsedate_to_datetime(email_date)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return parsed_date.strftime("%Y%m%d")
+
+
+# Elements whose content is never rendered as text
+_HTML_NON_TEXT_TAGS = frozenset({'style', 'script', 'noscript', 'link'})
+
+
+def _lxml_text_chunks(root) -> Iterator[str]:
+    """Text nodes under an lxml root in document order, skipping _HTML_NON_TEXT_TAGS.
+
+    Text either side of a skipped element (or a comment) stays two chunks, as
+    in BeautifulSoup's get_text().
+    """
+    walker = etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+    for event, element in walker:
+        if event == 'start':
+            if element.tag in _HTML_NON_TEXT_TAGS:
+                walker.skip_subtree()
+            elif element.text:
+                yield element.text
+        elif element.tail and element is not root:
+            yield element.tail
+
+
+def _looks_like_html(content: str) -> bool:
+    """True if a decoded single-part body is an HTML document rather than plain text."""
+    return _HTML_DOCUMENT_MARKER_RE.search(content) is not None
+
+
+def _index_headers(headers: List[dict[str, str]]) -> dict[str, str]:
+    """Gmail header list -> {lowercased name: value}, keeping the first of any repeated header."""
+    index: dict[str, str] = {}
+    for header in headers:
+        index.setdefault(header["name"].lower(), header["value"])
+    return index
+
+
+@lru_cache(maxsize=4096)
+def _match_merchant(subject_lower: str) -> Optional[Tuple[str, str]]:
+    """Return (merchant_name, merchant_type) for the first merchant named in a lowercased subject.
+
+    Cached because the same sender templates (and therefore subjects) repeat
+    across an ingestion run.
+    """
+    for merchant_name, merchant_data in _MERCHANTS.items():
+        for pattern in merchant_data['patterns']:
+            if pattern in subject_lower:
+                return merchant_name.capitalize(), merchant_data['type']
+    return None
+
+
+def _format_amount(amount: float) -> str:
+    """Amount as Gmail search text: "1500" for whole amounts, "1500.5" otherwise."""
+    return str(int(amount)) if amount == int(amount) else str(amount)
+
+
+@lru_cache(maxsize=1)
+def _gmail_discovery_document() -> Optional[dict]:
+    """Gmail v1 discovery document bundled with googleapiclient, parsed once per process."""
+    document = discovery_cache.get_static_doc("gmail", "v1")
+    return json.loads(document) if document else None
+
+
+class _OrjsonModel(JsonModel):
+    """googleapiclient JSON model that parses response bodies with orjson."""
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Non-JSON bodies: keep JsonModel's behaviour
+            return super().deserialize(content)
+        if self._data_wrapper and isinstance(body, dict) and "data" in body:
+            body = body["data"]
+        return body
+
+
+def _authorized_http(creds: Credentials) -> AuthorizedHttp:
+    """New keep-alive Gmail connection signed with creds; one per client plus one per worker thread."""
+    return AuthorizedHttp(creds, http=httplib2.Http(timeout=_GMAIL_HTTP_TIMEOUT))
+
+
+def _build_gmail_service(http: AuthorizedHttp):
+    """Gmail service on ``http``; reuses the parsed discovery document instead of re-reading it per client."""
+    document = _gmail_discovery_document()
+    if document is None:
+        return build("gmail", "v1", http=http, cache_discovery=False)
+    model = _OrjsonModel("dataWrapper" in document.get("features", [])) if HAS_ORJSON else None
+    return build_from_document(document, http=http, model=model)
+
+
+@lru_cache(maxsize=8)
+def _read_client_secret_file(path: str, mtime_ns: int) -> dict:
+    """Parsed OAuth client-secret JSON; mtime_ns is part of the key so edits are picked up."""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read()) if HAS_ORJSON else json.loads(f.read())
+
 
 class EmailClient:
     # Class-level credentials cache shared across all instances / requests.
     # Keyed by account_id so primary and secondary are cached independently.
     _credentials_cache: dict = {}
+    # account_id -> OAuth client config, so every instance after the first skips
+    # the client-secret file / settings lookup.
+    _client_config_cache: dict[str, dict] = {}
+
+    # account_id -> settings names for (client secret file, client id, client secret, refresh token).
+    # Unknown account IDs use the primary account's settings.
+    _ACCOUNT_SETTINGS = {
+        "primary": ("GOOGLE_CLIENT_SECRET_FILE", "GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REFRESH_TOKEN"),
+        "secondary": ("GOOGLE_CLIENT_SECRET_FILE_2", "GOOGLE_CLIENT_ID_2", "GOOGLE_CLIENT_SECRET_2", "GOOGLE_REFRESH_TOKEN_2"),
+    }
 
     def __init__(self, account_id: str = "primary"):
         self.settings = get_settings()
         self.account_id = account_id
-        self.client_config = self._load_client_config()
+        self.client_config = self._cached_client_config()
         self.token_manager = TokenManager(account_id)
+        # Monotonic deadline until which self.creds is known to be fresh, so
+        # _refresh_credentials() can short-circuit without re-checking expiry.
+        self._creds_valid_until: float = 0.0
+        # Guards credential swaps and refreshes; re-entrant because a refresh calls set_credentials()
+        self._credentials_lock = threading.RLock()
         self.creds = self._get_credentials()
-        self.service = build("gmail", "v1", credentials=self.creds, cache_discovery=False)
+        # One authorized connection for the service's lifetime; a token refresh
+        # swaps its credentials instead of rebuilding the service and reconnecting
+        self._http = _authorized_http(self.creds)
+        self.service = _build_gmail_service(self._http)
+        # Per-thread AuthorizedHttp for _execute(); httplib2.Http is not thread-safe
+        self._local = threading.local()
+        # (start_date, end_date, query, max_results) -> (monotonic fetch time, message stubs)
+        self._search_cache: "OrderedDict[Tuple[str, str, str, Optional[int]], Tuple[float, List[dict[str, Any]]]]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+
+    def _account_settings(self) -> Tuple[str, str, str, str]:
+        """Settings attribute names holding this account's OAuth client and refresh token."""
+        return self._ACCOUNT_SETTINGS.get(self.account_id, self._ACCOUNT_SETTINGS["primary"])
+
+    def _cached_client_config(self) -> dict:
+        """Client config for this account, loaded once per process.
+
+        Empty configs are not cached so credentials added later are still found.
+        """
+        client_config = EmailClient._client_config_cache.get(self.account_id)
+        if client_config is None:
+            client_config = self._load_client_config()
+            if client_config:
+                EmailClient._client_config_cache[self.account_id] = client_config
+        return client_config
 
     def _load_client_config(self) -> dict:
         """Load client configuration from JSON file or environment variables"""
         # Determine which account credentials to use
-        if self.account_id == "secondary":
-            client_secret_file = self.settings.GOOGLE_CLIENT_SECRET_FILE_2
-            client_id = self.settings.GOOGLE_CLIENT_ID_2
-            client_secret = self.settings.GOOGLE_CLIENT_SECRET_2
-        else:  # primary account
-            client_secret_file = self.settings.GOOGLE_CLIENT_SECRET_FILE
-            client_id = self.settings.GOOGLE_CLIENT_ID
-            client_secret = self.settings.GOOGLE_CLIENT_SECRET
+        file_attr, id_attr, secret_attr, _ = self._account_settings()
+        client_secret_file = getattr(self.settings, file_attr)
+        client_id = getattr(self.settings, id_attr)
+        client_secret = getattr(self.settings, secret_attr)
         
         # Try to load from JSON file first
         if client_secret_file:
             json_path = Path(client_secret_file)
             if json_path.exists():
                 try:
-                    with open(json_path, 'r') as f:
-                        client_config = json.load(f)
+                    client_config = _read_client_secret_file(str(json_path), json_path.stat().st_mtime_ns)
                     web_config = client_config.get("web", {})
                     logger.info(f"Loaded Gmail credentials for {self.account_id} account from {json_path}")
                     return {
@@ -84,10 +672,7 @@ class EmailClient:
     
     def _get_credentials(self) -> Credentials:
         """Get credentials for the specified account"""
-        if self.account_id == "secondary":
-            refresh_token = self.settings.GOOGLE_REFRESH_TOKEN_2
-        else:  # primary account
-            refresh_token = self.settings.GOOGLE_REFRESH_TOKEN
+        refresh_token = getattr(self.settings, self._account_settings()[3])
         
         if not refresh_token:
             raise ValueError(f"No refresh token found for {self.account_id} account")
@@ -100,54 +685,92 @@ class EmailClient:
             token_uri="https://oauth2.googleapis.com/token",
         )
 
+    def _mark_credentials_fresh(self, creds: Credentials) -> None:
+        """Remember how long ``creds`` can be reused before the next expiry check.
+
+        The deadline stops ``refresh_threshold`` seconds short of the real expiry
+        so it lines up with TokenManager's proactive refresh window.
+        """
+        if not creds.expiry:
+            self._creds_valid_until = 0.0
+            return
+        remaining = (creds.expiry - datetime.utcnow()).total_seconds() - self.token_manager.refresh_threshold
+        self._creds_valid_until = time.monotonic() + max(0.0, remaining)
+
+    def set_credentials(self, creds: Credentials) -> None:
+        """Switch to creds, keeping the Gmail service and its open connections."""
+        with self._credentials_lock:
+            if self.creds is creds:
+                return
+            self.creds = creds
+            self._http.credentials = creds
+
     def _refresh_credentials(self) -> bool:
         """Refresh Gmail credentials if needed. Uses a class-level cache so that
         a valid access token is reused across requests and only refreshed when
-        it is actually expired (or within the 5-minute proactive window)."""
-        try:
-            cached = EmailClient._credentials_cache.get(self.account_id)
-            if cached and not self.token_manager._is_token_expired(cached):
-                # Cached credentials are still valid — reuse them without a network call.
-                if self.creds is not cached:
-                    self.creds = cached
-                    self.service = build("gmail", "v1", credentials=self.creds, cache_discovery=False)
-                return True
+        it is actually expired (or within the 5-minute proactive window).
+
+        Within the lifetime of the current token this is a single clock
+        comparison, so public methods can call it on every request."""
+        if time.monotonic() < self._creds_valid_until:
+            return True
 
-            # No valid cache — do the actual refresh.
-            new_creds = self.token_manager.get_valid_credentials()
-            if new_creds:
-                self.creds = new_creds
-                EmailClient._credentials_cache[self.account_id] = new_creds
-                self.service = build("gmail", "v1", credentials=self.creds, cache_discovery=False)
-                logger.info(f"Gmail credentials refreshed successfully for {self.account_id} account")
+        # Shared clients (get_email_client) are used from several threads; one refreshes at a time
+        with self._credentials_lock:
+            if time.monotonic() < self._creds_valid_until:
                 return True
-            else:
-                logger.error(f"Failed to get valid credentials for {self.account_id} account")
+
+            try:
+                cached = EmailClient._credentials_cache.get(self.account_id)
+                if cached and not self.token_manager._is_token_expired(cached):
+                    # Cached credentials are still valid — reuse them without a network call.
+                    self.set_credentials(cached)
+                    self._mark_credentials_fresh(cached)
+                    return True
+
+                # No valid cache — do the actual refresh.
+                new_creds = self.token_manager.get_valid_credentials()
+                if new_creds:
+                    self.set_credentials(new_creds)
+                    EmailClient._credentials_cache[self.account_id] = self.creds
+                    self._mark_credentials_fresh(self.creds)
+                    logger.info(f"Gmail credentials refreshed successfully for {self.account_id} account")
+                    return True
+                else:
+                    logger.error(f"Failed to get valid credentials for {self.account_id} account")
+                    return False
+            except Exception:
+                logger.error(f"Failed to refresh Gmail credentials for {self.account_id}", exc_info=True)
                 return False
-        except Exception:
-            logger.error(f"Failed to refresh Gmail credentials for {self.account_id}", exc_info=True)
-            return False
 
-    def list_recent_transaction_emails(self, max_results: int = 25, days_back: int = 7) -> List[dict[str, Any]]:
-        """List recent transaction-related emails using simple keyword search"""
+    def list_recent_transaction_emails(
+        self, max_results: int = 25, days_back: int = 7, include_headers: bool = False
+    ) -> List[dict[str, Any]]:
+        """
+        List recent transaction-related emails using simple keyword search.
+
+        With include_headers, each stub also gets subject/sender/date from a
+        batched format="metadata" fetch, so no message body is downloaded.
+        """
         if not self._refresh_credentials():
             raise Exception("Failed to authenticate with Gmail")
 
         # Build simple query for transaction-related emails
-        date_filter = (datetime.now() - timedelta(days=days_back)).strftime("%Y/%m/%d")
+        date_filter = (datetime.now() - timedelta(days=days_back)).strftime(_GMAIL_DATE_FMT)
         query = f"after:{date_filter} AND (statement OR transaction OR receipt OR payment OR invoice)"
         
         logger.info(f"Using search query: {query}")
         
         try:
-            resp = (
-                self.service.users()
-                .messages()
-                .list(userId="me", q=query, maxResults=max_results)
-                .execute()
-            )
-            messages = resp.get("messages", [])
+            messages = self._list_messages(query, max_results)
             logger.info(f"Found {len(messages)} transaction emails")
+            if include_headers and messages:
+                metadata = self._get_listing_metadata([m["id"] for m in messages])
+                for message in messages:
+                    headers = _index_headers(metadata.get(message["id"], {}).get("payload", {}).get("headers", []))
+                    message["subject"] = headers.get("subject", "")
+                    message["sender"] = headers.get("from", "")
+                    message["date"] = headers.get("date", "")
             return messages
         except Exception:
             logger.error("Error listing Gmail messages", exc_info=True)
@@ -193,94 +816,203 @@ class EmailClient:
         logger.info("Fetching alert emails with query: %s", query)
 
         try:
-            messages = []
-            page_token = None
-            while True:
-                kwargs: dict[str, Any] = {
-                    "userId": "me",
-                    "maxResults": min(max_results, 500),
-                    "q": query,
-                }
-                if page_token:
-                    kwargs["pageToken"] = page_token
-                response = self.service.users().messages().list(**kwargs).execute()
-                batch = response.get("messages", [])
-                messages.extend(batch)
-                if len(messages) >= max_results:
-                    break
-                page_token = response.get("nextPageToken")
-                if not page_token:
-                    break
-
-            result = messages[:max_results]
+            result = self._list_messages(query, max_results)
             logger.info("Found %d alert emails", len(result))
             return result
         except Exception:
             logger.error("Failed to list alert emails", exc_info=True)
             return []
 
+    def _iter_message_pages(self, query: str, max_results: Optional[int] = None) -> Iterator[List[dict[str, Any]]]:
+        """
+        Yield pages of message stubs matching query, following nextPageToken.
+
+        Stops once max_results stubs have been seen (None = every match); the
+        last page may overshoot, so callers that need an exact cap slice.
+        """
+        page_token = None
+        seen = 0
+        while True:
+            kwargs: dict[str, Any] = {
+                "userId": "me",
+                "maxResults": min(max_results or _GMAIL_PAGE_SIZE, _GMAIL_PAGE_SIZE),
+                "q": query,
+            }
+            if page_token:
+                kwargs["pageToken"] = page_token
+            response = self._execute(self.service.users().messages().list(**kwargs))
+            page = response.get("messages", [])
+            seen += len(page)
+            yield page
+            if max_results is not None and seen >= max_results:
+                break
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+
+    def _list_messages(self, query: str, max_results: Optional[int] = None) -> List[dict[str, Any]]:
+        """Message stubs matching query across as many pages as max_results needs."""
+        messages: List[dict[str, Any]] = []
+        for page in self._iter_message_pages(query, max_results):
+            messages.extend(page)
+        return messages[:max_results]
+
+    def _execute(self, request):
+        """Execute a googleapiclient request on this thread's own HTTP connection."""
+        local = self._local
+        http = getattr(local, "http", None)
+        if http is None:
+            http = local.http = _authorized_http(self.creds)
+        elif http.credentials is not self.creds:
+            # Refreshed token: re-sign on the same connection
+            http.credentials = self.creds
+        return request.execute(http=http)
+
     def get_email_content(self, message_id: str) -> dict[str, Any]:
         """Get full email content including body and attachments"""
+        cached = _cached_email_content(self.account_id, message_id)
+        if cached is not None:
+            return cached
         if not self._refresh_credentials():
             raise Exception("Failed to authenticate with Gmail")
+        return self._fetch_email_content(message_id)
 
+    def get_email_contents(self, message_ids: List[str], max_workers: int = 8) -> dict[str, dict[str, Any]]:
+        """
+        Fetch and parse several emails concurrently.
+
+        Returns a dict keyed by message ID; messages that failed to fetch or
+        parse are logged and left out, so callers can treat a missing key as an error.
+        """
+        contents: dict[str, dict[str, Any]] = {}
+        for message_id in message_ids:
+            cached = _cached_email_content(self.account_id, message_id)
+            if cached is not None:
+                contents[message_id] = cached
+        to_fetch = [message_id for message_id in message_ids if message_id not in contents]
+        if not to_fetch:
+            return {message_id: contents[message_id] for message_id in message_ids if message_id in contents}
+        if not self._refresh_credentials():
+            raise Exception("Failed to authenticate with Gmail")
+
+        # One batch request per _GMAIL_BATCH_SIZE messages; anything the batch
+        # didn't return is retried with individual requests on a thread pool
         try:
-            message = (
+            messages = self._batch_get_messages(to_fetch)
+        except Exception:
+            logger.warning("Batch message fetch failed, falling back to individual requests", exc_info=True)
+            messages = {}
+
+        for message_id, message in messages.items():
+            try:
+                contents[message_id] = self._parse_message(message_id, message)
+                _remember_email_content(self.account_id, message_id, contents[message_id])
+            except Exception:
+                logger.error(f"Error getting email content for {message_id}", exc_info=True)
+
+        remaining = [message_id for message_id in to_fetch if message_id not in messages]
+        if remaining:
+            def fetch(message_id: str) -> Tuple[str, Optional[dict[str, Any]]]:
+                try:
+                    return message_id, self._fetch_email_content(message_id)
+                except Exception:
+                    return message_id, None
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(remaining)))) as pool:
+                contents.update(
+                    (message_id, content)
+                    for message_id, content in pool.map(fetch, remaining)
+                    if content is not None
+                )
+
+        return {message_id: contents[message_id] for message_id in message_ids if message_id in contents}
+
+    async def get_email_contents_async(self, message_ids: List[str], max_workers: int = 8) -> dict[str, dict[str, Any]]:
+        """Async variant of get_email_contents; the Gmail I/O runs off the event loop"""
+        return await asyncio.to_thread(self.get_email_contents, message_ids, max_workers)
+
+    def _batch_get_messages(
+        self,
+        message_ids: List[str],
+        format: str = "full",
+        metadata_headers: Optional[List[str]] = None,
+        fields: Optional[str] = None,
+    ) -> dict[str, dict[str, Any]]:
+        """
+        Fetch messages with Gmail batch requests (_GMAIL_BATCH_SIZE per HTTP round-trip).
+
+        Returns raw messages keyed by ID; IDs whose sub-request failed are
+        left out so the caller can retry them.
+        """
+        messages: dict[str, dict[str, Any]] = {}
+
+        def on_response(request_id: str, response: dict[str, Any], exception: Optional[Exception]) -> None:
+            if exception is None:
+                messages[request_id] = response
+            else:
+                logger.warning(f"Batch fetch failed for message {request_id}: {exception}")
+
+        unique_ids = list(dict.fromkeys(message_ids))
+        for start in range(0, len(unique_ids), _GMAIL_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message_id in unique_ids[start:start + _GMAIL_BATCH_SIZE]:
+                kwargs: dict[str, Any] = {"userId": "me", "id": message_id, "format": format}
+                if metadata_headers:
+                    kwargs["metadataHeaders"] = metadata_headers
+                if fields:
+                    kwargs["fields"] = fields
+                batch.add(self.service.users().messages().get(**kwargs), request_id=message_id)
+            self._execute(batch)
+        return messages
+
+    def _get_listing_metadata(self, message_ids: List[str], max_workers: int = 8) -> dict[str, dict[str, Any]]:
+        """
+        Subject/From/Date metadata for message_ids, keyed by ID.
+
+        Batched first; IDs the batch didn't return (or all of them, if the batch
+        call itself failed) are retried as individual gets on a thread pool.
+        """
+        try:
+            metadata = self._batch_get_messages(
+                message_ids, format="metadata", metadata_headers=_LISTING_HEADERS, fields=_LISTING_FIELDS
+            )
+        except Exception:
+            logger.warning("Batch metadata fetch failed, falling back to individual requests", exc_info=True)
+            metadata = {}
+
+        remaining = [message_id for message_id in dict.fromkeys(message_ids) if message_id not in metadata]
+        if remaining:
+            def fetch(message_id: str) -> Tuple[str, Optional[dict[str, Any]]]:
+                try:
+                    return message_id, self._execute(
+                        self.service.users()
+                        .messages()
+                        .get(
+                            userId="me", id=message_id, format="metadata",
+                            metadataHeaders=_LISTING_HEADERS, fields=_LISTING_FIELDS,
+                        )
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to get details for message {message_id}: {e}")
+                    return message_id, None
+
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(remaining)))) as pool:
+                metadata.update(
+                    (message_id, message) for message_id, message in pool.map(fetch, remaining) if message is not None
+                )
+        return metadata
+
+    def _fetch_email_content(self, message_id: str) -> dict[str, Any]:
+        """Fetch one message and parse it; assumes credentials were already refreshed."""
+        try:
+            message = self._execute(
                 self.service.users()
                 .messages()
                 .get(userId="me", id=message_id, format="full")
-                .execute()
             )
-            
-            # Parse email headers
-            headers = message.get("payload", {}).get("headers", [])
-            subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
-            sender = next((h["value"] for h in headers if h["name"] == "From"), "")
-            date = next((h["value"] for h in headers if h["name"] == "Date"), "")
-            
-            # Extract email body
-            body = self._extract_email_body(message.get("payload", {}))
-            
-            # Extract attachments
-            attachments = self._extract_attachments(message.get("payload", {}))
-            
-            # Extract Uber trip info if this is an Uber email
-            uber_trip_info = None
-            if "uber" in subject.lower() or "uber" in sender.lower():
-                html_content = self._extract_html_content(message.get("payload", {}))
-                if html_content:
-                    uber_trip_info = self._parse_uber_trip_info(html_content)
-            
-            # Extract Swiggy order info if this is a Swiggy or Instamart email
-            swiggy_order_info = None
-            if "swiggy" in subject.lower() or "instamart" in subject.lower():
-                html_content = self._extract_html_content(message.get("payload", {}))
-                if html_content:
-                    swiggy_order_info = self._parse_swiggy_order_info(html_content)
-            
-            # Detect merchant type for generic merchant info
-            merchant_info = self._detect_merchant_info(subject, sender, body)
-            
-            result = {
-                "id": message_id,
-                "subject": subject,
-                "sender": sender,
-                "date": date,
-                "body": body,
-                "attachments": attachments,
-                "raw_message": message
-            }
-            
-            if uber_trip_info:
-                result["uber_trip_info"] = uber_trip_info
-            
-            if swiggy_order_info:
-                result["swiggy_order_info"] = swiggy_order_info
-            
-            if merchant_info:
-                result["merchant_info"] = merchant_info
-            
-            return result
+            content = self._parse_message(message_id, message)
+            _remember_email_content(self.account_id, message_id, content)
+            return content
         except HttpError as e:
             if e.resp.status == 404:
                 # Expected: message not in this account — caller will try the other account
@@ -291,36 +1023,116 @@ class EmailClient:
             logger.error(f"Error getting email content for {message_id}", exc_info=True)
             raise
 
-    def _extract_email_body(self, payload: dict) -> str:
-        """Extract email body from Gmail message payload"""
+    def _parse_message(self, message_id: str, message: dict[str, Any]) -> dict[str, Any]:
+        """Turn a format=full Gmail message into the get_email_content() result dict."""
+        # Parse email headers
+        hdrs = _index_headers(message.get("payload", {}).get("headers", []))
+        subject = hdrs.get("subject", "")
+        sender = hdrs.get("from", "")
+        date = hdrs.get("date", "")
+        
+        payload = message.get("payload", {})
+        
+        # Extract email body (and the HTML part it decoded along the way)
+        body, html_content = self._extract_email_body(payload)
+        
+        # Extract attachments
+        attachments = self._extract_attachments(payload)
+        
+        subject_lower = subject.lower()
+        is_uber = "uber" in subject_lower or "uber" in sender.lower()
+        is_swiggy = "swiggy" in subject_lower or "instamart" in subject_lower
+        if (is_uber or is_swiggy) and html_content is None:
+            html_content = self._extract_html_content(payload)
+        
+        # Extract Uber trip info if this is an Uber email
+        uber_trip_info = None
+        if is_uber and html_content:
+            uber_trip_info = self._parse_uber_trip_info(html_content)
+        
+        # Extract Swiggy order info if this is a Swiggy or Instamart email
+        swiggy_order_info = None
+        if is_swiggy and html_content:
+            swiggy_order_info = self._parse_swiggy_order_info(html_content)
+        
+        # Detect merchant type for generic merchant info
+        merchant_info = self._detect_merchant_info(subject, sender, body)
+        
+        result = {
+            "id": message_id,
+            "subject": subject,
+            "sender": sender,
+            "date": date,
+            "body": body,
+            "attachments": attachments,
+            "raw_message": message
+        }
+        
+        if uber_trip_info:
+            result["uber_trip_info"] = uber_trip_info
+        
+        if swiggy_order_info:
+            result["swiggy_order_info"] = swiggy_order_info
+        
+        if merchant_info:
+            result["merchant_info"] = merchant_info
+        
+        return result
+
+    def _extract_email_body(self, payload: dict) -> Tuple[str, Optional[str]]:
+        """
+        Extract email body from Gmail message payload.
+
+        Returns (text, html). html is the HTML this walk already decoded when it
+        is the same part _extract_html_content() would pick, otherwise None.
+        """
         if "body" in payload and payload["body"].get("data"):
             # Simple text email
             data = payload["body"]["data"]
-            return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+            content = _b64url_decode_text(data)
+            return content, content if _looks_like_html(content) else None
         
         elif "parts" in payload:
             # Multipart email
             body_parts = []
+            html = None
+            # A nested multipart before the first HTML part may hold the HTML
+            # _extract_html_content() would find first, so don't claim one then.
+            seen_nested = False
             for part in payload["parts"]:
                 if part.get("mimeType") == "text/plain":
                     if part.get("body", {}).get("data"):
                         data = part["body"]["data"]
-                        body_parts.append(base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore"))
+                        body_parts.append(_b64url_decode_text(data))
                 elif part.get("mimeType") == "text/html":
                     # Fallback to HTML if no plain text
                     if part.get("body", {}).get("data"):
                         data = part["body"]["data"]
-                        html_content = base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+                        html_content = _b64url_decode_text(data)
+                        if html is None and not seen_nested:
+                            html = html_content
                         # Convert HTML to text, removing style/script tags and their content
                         text_content = self._html_to_text(html_content)
                         body_parts.append(text_content)
+                if "parts" in part:
+                    seen_nested = True
             
-            return "\n".join(body_parts)
+            return "\n".join(body_parts), html
         
-        return ""
+        return "", None
 
     def _html_to_text(self, html_content: str) -> str:
         """Convert HTML to plain text, removing style/script tags and cleaning up"""
+        if HAS_LXML:
+            try:
+                root = lxml.html.fromstring(html_content)
+                # Same shape as BeautifulSoup's get_text(separator='\n', strip=True) below, ~20x faster
+                text = '\n'.join(filter(None, (chunk.strip() for chunk in _lxml_text_chunks(root))))
+                text = _CSS_AT_RULE_RE.sub('', text)
+                return _BLANK_LINES_RE.sub('\n\n', text)
+            except Exception as e:
+                logger.warning(f"Error parsing HTML with lxml: {e}, falling back")
+
         if HAS_BS4:
             try:
                 soup = BeautifulSoup(html_content, 'html.parser')
@@ -333,43 +1145,25 @@ class EmailClient:
                         del tag['style']
                 # Get text and clean up
                 text = soup.get_text(separator='\n', strip=True)
-                # Remove CSS-like patterns that might have leaked through (more aggressive)
-                # Match @media, @font-face, and other @ rules with nested braces
-                text = re.sub(r'@media[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-                text = re.sub(r'@font-face[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-                text = re.sub(r'@[a-z-]+\s*[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-                # Remove any remaining CSS-like patterns
-                text = re.sub(r'@media\s+[^{]*', '', text, flags=re.IGNORECASE)
-                text = re.sub(r'@font-face\s*', '', text, flags=re.IGNORECASE)
-                text = re.sub(r'@[a-z-]+\s+', '', text, flags=re.IGNORECASE)
+                # Remove CSS-like patterns that might have leaked through (more aggressive):
+                # @media, @font-face and other @ rules with nested braces, then bare @ prefixes
+                text = _CSS_AT_RULE_RE.sub('', text)
                 # Remove excessive whitespace
-                text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
+                text = _BLANK_LINES_RE.sub('\n\n', text)
                 return text
             except Exception as e:
                 logger.warning(f"Error parsing HTML with BeautifulSoup: {e}, falling back to regex")
         
         # Fallback to regex-based approach
         # Remove style and script tags with their content
-        text = re.sub(r'<style[^>]*>.*?</style>', '', html_content, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<script[^>]*>.*?</script>', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<noscript[^>]*>.*?</noscript>', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<link[^>]*>', '', text, flags=re.IGNORECASE)
-        # Remove inline styles
-        text = re.sub(r'style\s*=\s*["\'][^"\']*["\']', '', text, flags=re.IGNORECASE)
-        # Remove CSS @ rules that might appear in text (more aggressive)
-        # Match @media, @font-face, and other @ rules with nested braces
-        text = re.sub(r'@media[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'@font-face[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'@[a-z-]+\s*[^{]*\{[^{}]*(\{[^{}]*\}[^{}]*)*\}', '', text, flags=re.DOTALL | re.IGNORECASE)
-        # Remove any remaining CSS-like patterns
-        text = re.sub(r'@media\s+[^{]*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'@font-face\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'@[a-z-]+\s+', '', text, flags=re.IGNORECASE)
-        # Remove all remaining HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _HTML_HIDDEN_ELEMENTS_RE.sub('', html_content)
+        # Remove inline styles, CSS @ rules and all remaining HTML tags
+        text = _HTML_MARKUP_RE.sub('', text)
+        # Decode entities as the parsers above do; after tag removal so "&lt;b&gt;" stays text
+        text = unescape(text)
         # Clean up whitespace
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-        text = re.sub(r'[ \t]+', ' ', text)
+        text = _BLANK_LINES_RE.sub('\n\n', text)
+        text = _HORIZONTAL_SPACE_RE.sub(' ', text)
         return text.strip()
 
     def _extract_html_content(self, payload: dict) -> Optional[str]:
@@ -377,23 +1171,32 @@ class EmailClient:
         if "body" in payload and payload["body"].get("data"):
             # Simple HTML email
             data = payload["body"]["data"]
-            content = base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-            if "<html" in content.lower() or "<body" in content.lower():
-                return content
-            return None
+            content = _b64url_decode_text(data)
+            return content if _looks_like_html(content) else None
         
-        elif "parts" in payload:
-            # Multipart email - look for HTML part
-            for part in payload["parts"]:
+        # Multipart email - iterative depth-first walk for the first HTML part.
+        # Only HTML parts and nested multiparts are pushed, in reverse so siblings
+        # are visited in order.
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            if part is not payload:
                 if part.get("mimeType") == "text/html":
                     if part.get("body", {}).get("data"):
                         data = part["body"]["data"]
-                        return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-                # Recursively check nested parts
-                elif "parts" in part:
-                    html_content = self._extract_html_content(part)
-                    if html_content:
-                        return html_content
+                        return _b64url_decode_text(data)
+                    continue
+                if "body" in part and part["body"].get("data"):
+                    # Nested part carrying its own body: same check as a simple email
+                    data = part["body"]["data"]
+                    content = _b64url_decode_text(data)
+                    if _looks_like_html(content):
+                        return content
+                    continue
+            stack.extend(
+                child for child in reversed(part.get("parts", ()))
+                if child.get("mimeType") == "text/html" or "parts" in child
+            )
         
         return None
 
@@ -406,7 +1209,8 @@ class EmailClient:
         
         try:
             if HAS_BS4:
-                soup = BeautifulSoup(html_content, 'html.parser')
+                # lxml's C tree builder when available; the traversal below is parser-agnostic
+                soup = BeautifulSoup(html_content, 'lxml' if HAS_LXML else 'html.parser')
                 
                 # --- PRE-PROCESSING: REMOVE NOISE ---
                 # Remove style, script, and other non-visible tags to prevent CSS leakage
@@ -421,34 +1225,21 @@ class EmailClient:
                 amount_elem = soup.find(attrs={"data-testid": "total_fare_amount"})
                 if amount_elem:
                     amount_text = amount_elem.get_text(strip=True)
-                    amount_match = re.search(r'[\d,]+\.?\d*', amount_text.replace(',', ''))
+                    amount_match = _AMOUNT_DIGITS_RE.search(amount_text.replace(',', ''))
                     if amount_match:
                         trip_info["amount"] = amount_match.group()
                 
                 # Fallback: Look for "Total" followed by price in plain text
                 if "amount" not in trip_info:
-                    total_match = re.search(r'Total\s*(?:Fare|:)?\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', plain_text, re.I)
+                    total_match = _UBER_TOTAL_RE.search(plain_text)
                     if total_match:
                          trip_info["amount"] = total_match.group(1).replace(',', '')
 
                 # --- 2. VEHICLE TYPE ---
                 # Search in clean plain text only
                 # Patterns ordered by specificity
-                vehicle_patterns = [
-                    (r'\bUber\s*Premier\b', 'Uber Premier'),
-                    (r'\bUber\s*XL\b', 'Uber XL'),
-                    (r'\bUber\s*Go\s*Sedan\b', 'Uber Go Sedan'),
-                    (r'\bUber\s*Go\b', 'Uber Go'),
-                    (r'\bUber\s*Auto\b', 'Auto'),
-                    (r'\bAuto\b', 'Auto'),
-                    (r'\bMoto\b', 'Moto'),
-                    (r'\bUber\s*X\b', 'Uber X'),
-                    (r'\bUber\s*Intercity\b', 'Uber Intercity'),
-                    (r'\bSedan\b', 'Sedan')  # Generic fallback
-                ]
-                
-                for pattern, name in vehicle_patterns:
-                    if re.search(pattern, plain_text, re.I):
+                for pattern, name in _UBER_VEHICLE_PATTERNS:
+                    if pattern.search(plain_text):
                         trip_info["vehicle_type"] = name
                         break
 
@@ -457,10 +1248,8 @@ class EmailClient:
                 # Look for time patterns (HH:MM) which act as anchors for addresses
                 
                 locations = []
-                time_pattern = re.compile(r'(\d{1,2}:\d{2}\s*(?:AM|PM)?)', re.I)
-                
                 # Find all text nodes that look like times
-                time_nodes = soup.find_all(string=time_pattern)
+                time_nodes = soup.find_all(string=_UBER_TIME_RE)
                 
                 for node in time_nodes:
                     time_val = node.strip()
@@ -477,7 +1266,7 @@ class EmailClient:
                     
                     # Check next sibling text
                     next_node = node.find_next(string=True)
-                    if next_node and len(next_node.strip()) > 10 and not re.search(time_pattern, next_node):
+                    if next_node and len(next_node.strip()) > 10 and not _UBER_TIME_RE.search(next_node):
                          address_candidate = next_node.strip()
                     
                     # If not found, check table structure (common in receipts)
@@ -505,17 +1294,11 @@ class EmailClient:
                                         address_candidate = text
 
                     if address_candidate:
-                        # Exclude common non-address phrases
-                        skip_phrases = [
-                            'Thanks for riding', 'Total', 'Fare', 'Switch payment', 
-                            'Download', 'Help', 'Support', 'Rate or tip', 'Uber One',
-                            'License Plate', 'Trip details'
-                        ]
-                        
-                        # Validate address heuristic
+                        # Validate address heuristic, excluding common non-address phrases
+                        candidate_folded = address_candidate.casefold()
                         is_addr = (len(address_candidate) > 12 and 
-                                  not re.search(r'₹', address_candidate) and
-                                  not any(phrase.lower() in address_candidate.lower() for phrase in skip_phrases))
+                                  '₹' not in address_candidate and
+                                  not _UBER_SKIP_PHRASES_RE.search(candidate_folded))
                         
                         # Avoid duplicates
                         if is_addr and not any(loc['address'] == address_candidate for loc in locations):
@@ -537,63 +1320,53 @@ class EmailClient:
                 # --- 4. FARE BREAKDOWN (Items) ---
                 items = []
                 
-                # Keywords identifying fare items
-                fare_keywords = [
-                    'Base Fare', 'Distance', 'Time', 'Subtotal', 'Booking Fee', 
-                    'Promotion', 'Tolls', 'Taxes', 'Rounding', 'Wait Time', 
-                    'Cancellation Fee', 'Access Fee', 'Surge', 'Insurance',
-                    'Suggested fare', 'Trip Fare', 'Ride Fare'
-                ]
-                
                 # Find the fare breakdown section
                 # Usually a table. look for rows containing our keywords.
                 
                 # Iterate all table rows in the document
                 for row in soup.find_all('tr'):
-                    row_text = row.get_text(separator=' ', strip=True)
+                    row_folded = row.get_text(separator=' ', strip=True).casefold()
                     
                     # Check if this row looks like a fare item: "Name ... Amount"
-                    for keyword in fare_keywords:
-                        if keyword.lower() in row_text.lower():
-                            # Try to extract name and amount
-                            # Usually <td>Name</td> <td>Amount</td>
-                            cells = row.find_all('td')
-                            if len(cells) >= 2:
-                                name_text = cells[0].get_text(strip=True)
-                                amount_text = cells[-1].get_text(strip=True) # Amount usually last
-                                
-                                # Verify amount looks like currency
-                                amount_match = re.search(r'[\d,]+\.?\d*', amount_text.replace(',', ''))
-                                if amount_match and len(name_text) < 50:
-                                    items.append({
-                                        "name": name_text,
-                                        "quantity": 1,
-                                        # Optional: store price if we want, schema expects name/qty, maybe price in name?
-                                        # For now, just name is fine, usage might vary.
-                                    })
-                                    # Append price to name for clarity in UI? "Base Fare (₹45.00)"
-                                    items[-1]["name"] = f"{name_text} ({amount_text})"
-                            break
+                    if _UBER_FARE_KEYWORDS_RE.search(row_folded):
+                        # Try to extract name and amount
+                        # Usually <td>Name</td> <td>Amount</td>
+                        cells = row.find_all('td')
+                        if len(cells) >= 2:
+                            name_text = cells[0].get_text(strip=True)
+                            amount_text = cells[-1].get_text(strip=True) # Amount usually last
+                            
+                            # Verify amount looks like currency
+                            amount_match = _AMOUNT_DIGITS_RE.search(amount_text.replace(',', ''))
+                            if amount_match and len(name_text) < 50:
+                                items.append({
+                                    "name": name_text,
+                                    "quantity": 1,
+                                    # Optional: store price if we want, schema expects name/qty, maybe price in name?
+                                    # For now, just name is fine, usage might vary.
+                                })
+                                # Append price to name for clarity in UI? "Base Fare (₹45.00)"
+                                items[-1]["name"] = f"{name_text} ({amount_text})"
                 
                 if items:
                     trip_info["items"] = items
 
                 # Extract distance/duration
-                dist_match = re.search(r'(\d+\.?\d*)\s*(kilometres|km)', plain_text, re.I)
+                dist_match = _UBER_DISTANCE_RE.search(plain_text)
                 if dist_match:
                     trip_info["distance"] = f"{dist_match.group(1)} {dist_match.group(2)}"
                 
-                dur_match = re.search(r'(\d+)\s*(min|min\.|minutes)', plain_text, re.I)
+                dur_match = _UBER_DURATION_RE.search(plain_text)
                 if dur_match:
                     trip_info["duration"] = f"{dur_match.group(1)} min"
 
             else:
                 # RegEx fallback (simplified)
                 # Cleanup
-                plain_text = re.sub(r'<style[^>]*>.*?</style>', '', html_content, flags=re.DOTALL | re.IGNORECASE)
-                plain_text = re.sub(r'<[^>]+>', ' ', plain_text)
+                plain_text = _STYLE_TAG_RE.sub('', html_content)
+                plain_text = _HTML_TAG_RE.sub(' ', plain_text)
                 
-                amount_match = re.search(r'Total\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', plain_text, re.I)
+                amount_match = _UBER_TOTAL_FALLBACK_RE.search(plain_text)
                 if amount_match:
                     trip_info["amount"] = amount_match.group(1).replace(',', '')
                 
@@ -615,6 +1388,11 @@ class EmailClient:
         if not html_content:
             return None
         
+        # Cheap bail-out before building a soup for mail that isn't from Swiggy
+        html_lower = html_content.lower()
+        if 'swiggy' not in html_lower and 'instamart' not in html_lower:
+            return None
+        
         order_info = {}
         
         try:
@@ -626,7 +1404,8 @@ class EmailClient:
                 
                 # Detect order type
                 is_instamart = False
-                if 'instamart' in plain_text.lower() or 'instamart' in str(html_content).lower():
+                # Visible text is a subset of the raw HTML, so one check covers both
+                if 'instamart' in html_lower:
                     order_info["order_type"] = "Instamart"
                     is_instamart = True
                     order_info["restaurant_name"] = "Swiggy Instamart"
@@ -639,7 +1418,7 @@ class EmailClient:
                 if not is_instamart:
                     # New layout: <p>ORDER JOURNEY</p> followed by a <table> whose first bold <p>
                     # is the restaurant name.
-                    oj_tag = soup.find(string=re.compile(r'^\s*ORDER JOURNEY\s*$', re.I))
+                    oj_tag = soup.find(string=_ORDER_JOURNEY_LABEL_RE)
                     if oj_tag:
                         oj_parent = oj_tag.find_parent()
                         if oj_parent:
@@ -650,13 +1429,13 @@ class EmailClient:
                                     style = p.get('style', '')
                                     if 'font-weight: 700' in style or 'font-weight:700' in style:
                                         candidate = p.get_text(strip=True)
-                                        if candidate and len(candidate) < 80 and not re.search(r'\d{1,2}:\d{2}|No\.|^\d', candidate):
+                                        if candidate and len(candidate) < 80 and not _NOT_RESTAURANT_NAME_RE.search(candidate):
                                             order_info["restaurant_name"] = candidate
                                             break
 
                     # Old layout: <p>Restaurant</p> followed by <h5>Restaurant Name</h5>
                     if "restaurant_name" not in order_info:
-                        restaurant_label = soup.find('p', string=re.compile(r'^\s*Restaurant\s*$', re.I))
+                        restaurant_label = soup.find('p', string=_RESTAURANT_LABEL_RE)
                         if restaurant_label:
                             parent = restaurant_label.find_parent()
                             if parent:
@@ -668,7 +1447,7 @@ class EmailClient:
 
                     # Fallback: Look for "at [Restaurant Name] was completed" pattern (Swiggy Dineout)
                     if "restaurant_name" not in order_info:
-                        restaurant_match = re.search(r'at\s+([A-Z][A-Za-z\s&\'-]+?)\s+was\s+completed', plain_text)
+                        restaurant_match = _DINEOUT_RESTAURANT_RE.search(plain_text)
                         if restaurant_match:
                             restaurant_name = restaurant_match.group(1).strip()
                             if len(restaurant_name) < 50 and restaurant_name not in ['Here', 'Your']:
@@ -678,14 +1457,14 @@ class EmailClient:
                 # For Instamart, prioritize extracting "Grand Total" from Order Summary table
                 if is_instamart:
                     # Look for "Grand Total" in a table cell
-                    grand_total_elem = soup.find(string=re.compile(r'Grand\s*Total', re.I))
+                    grand_total_elem = soup.find(string=_GRAND_TOTAL_LABEL_RE)
                     if grand_total_elem:
                         # The amount is usually in the next cell or in the same row
                         row = grand_total_elem.find_parent('tr')
                         if row:
                             # Look for currency pattern in the row
                             amount_text = row.get_text(strip=True)
-                            amount_match = re.search(r'₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', amount_text)
+                            amount_match = _RUPEE_AMOUNT_RE.search(amount_text)
                             if amount_match:
                                 order_info["amount"] = amount_match.group(1).replace(',', '')
                 
@@ -699,23 +1478,14 @@ class EmailClient:
                         if amount_td:
                             amount_text = amount_td.get_text(strip=True)
                             # Extract number from text like "₹ 587" or "₹587"
-                            amount_match = re.search(r'₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', amount_text)
+                            amount_match = _RUPEE_AMOUNT_RE.search(amount_text)
                             if amount_match:
                                 order_info["amount"] = amount_match.group(1).replace(',', '')
                 
                 # Fallback amount extraction
                 if "amount" not in order_info:
-                    amount_patterns = [
-                        r'Grand\s*Total[:\s]+₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
-                        r'Order Total[:\s]+₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
-                        r'Paid\s+Via\s+[^\n₹]*₹\s*(\d+(?:,\d+)*(?:\.\d{2})?)',  # New layout: "Paid Via Credit/Debit card ₹485.00"
-                        r'payment of Rs\.\s*(\d+(?:,\d+)*)',  # Swiggy Dineout pattern
-                        r'₹\s*(\d+(?:,\d+)*(?:\.\d{2})?)',
-                        r'Rs\.?\s*(\d+(?:,\d+)*(?:\.\d{2})?)'
-                    ]
-                    
-                    for pattern in amount_patterns:
-                        amount_match = re.search(pattern, plain_text, re.I)
+                    for pattern in _SWIGGY_AMOUNT_RES:
+                        amount_match = pattern.search(plain_text)
                         if amount_match:
                             amount_str = amount_match.group(1).replace(',', '')
                             order_info["amount"] = amount_str
@@ -724,7 +1494,7 @@ class EmailClient:
                 # Extract delivery address
                 # Pattern: <p>Delivery To:</p> followed by <h5> tags with address parts
                 # Instamart also uses "Deliver To:" or similar
-                delivery_label = soup.find(string=re.compile(r'Deliver\w*\s+To:', re.I))
+                delivery_label = soup.find(string=_is_deliver_to_label)
                 if delivery_label:
                     parent = delivery_label.find_parent()
                     # Go up one more level if parent is just a formatting tag
@@ -737,8 +1507,9 @@ class EmailClient:
                         container = parent.find_parent()
                         if container:
                             address_parts = []
-                            # Try food delivery structure first
-                            for h5 in container.find_all('h5'):
+                            # Try food delivery structure first. Swiggy addresses span at most
+                            # ~5 <h5> lines (name, flat, street, area, city), so stop after 8.
+                            for h5 in container.find_all('h5', limit=8):
                                 text = h5.get_text(strip=True)
                                 if text:
                                     address_parts.append(text)
@@ -747,7 +1518,7 @@ class EmailClient:
                                 # Try Instamart structure (often just text in div/p)
                                 # Look for text content after the label
                                 full_text = container.get_text(separator=' ', strip=True)
-                                addr_match = re.search(r'Deliver\w*\s+To:\s*(.*?)(?:\s*Order|$)', full_text, re.I)
+                                addr_match = _DELIVER_TO_ADDR_RE.search(full_text)
                                 if addr_match:
                                     addr_text = addr_match.group(1).strip()
                                     if len(addr_text) > 10:
@@ -755,18 +1526,18 @@ class EmailClient:
 
                         if address_parts:
                             # Join address parts, skipping the first one if it's just a name
-                            if len(address_parts) > 1 and len(address_parts[0]) < 20 and not re.search(r'\d', address_parts[0]):
+                            if len(address_parts) > 1 and len(address_parts[0]) < 20 and not _DIGIT_RE.search(address_parts[0]):
                                 address_parts = address_parts[1:]
                             order_info["delivery_address"] = ', '.join(address_parts)
                 
                 # Fallback: Extract date/time from "Order delivered at" pattern
-                datetime_match = re.search(r'(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday),\s+([A-Z][a-z]+\s+\d{1,2},\s+\d{4})\s+(\d{1,2}:\d{2}\s*(?:AM|PM)?)', plain_text, re.I)
+                datetime_match = _WEEKDAY_DATETIME_RE.search(plain_text)
                 if datetime_match:
-                    order_info["order_date"] = datetime_match.group(2)
-                    order_info["order_time"] = datetime_match.group(3)
+                    order_info["order_date"] = datetime_match.group(1)
+                    order_info["order_time"] = datetime_match.group(2)
                 
                 # Extract order ID
-                order_id_match = re.search(r'Order\s*(?:#|No\.?|ID)?[:\s]*(\d+)', plain_text, re.I)
+                order_id_match = _SWIGGY_ORDER_ID_RE.search(plain_text)
                 if order_id_match:
                     order_info["order_id"] = order_id_match.group(1)
                 
@@ -778,44 +1549,41 @@ class EmailClient:
                     # Strategy: Look for rows with "Item Name" headers or just parse all tables looking for quantity pattern
                     # Instamart items often look like: <td>1 x Item Name</td> <td>₹Price</td>
                     
-                    # Find all tables
-                    tables = soup.find_all('table')
-                    for table in tables:
-                        # Convert table to text to see if it looks like an item
-                        table_text = table.get_text(separator=' ', strip=True)
-                        
-                        # Skip summary tables
-                        if any(k in table_text.lower() for k in ['grand total', 'item bill', 'handling fee', 'delivery partner fee']):
+                    # Only the first cell of each row can hold "N x Item", so select exactly
+                    # those cells in one pass instead of walking tables -> rows -> cells.
+                    summary_tables: dict[int, bool] = {}
+                    for cell in soup.select('table tr > td:first-of-type'):
+                        # Skip summary tables (checked once per enclosing table)
+                        table = cell.find_parent('table')
+                        is_summary = summary_tables.get(id(table))
+                        if is_summary is None:
+                            is_summary = bool(_INSTAMART_SUMMARY_RE.search(table.get_text(separator=' ', strip=True)))
+                            summary_tables[id(table)] = is_summary
+                        if is_summary:
                             continue
-                            
-                        # Look for item pattern: quantity explicitly like "1 x " or just number start
-                        # Instamart items usually have quantity "N x " at start of a cell
-                        # Check rows
-                        for row in table.find_all('tr'):
-                            cells = row.find_all('td')
-                            if not cells: 
-                                continue
-                                
-                            cell_text = cells[0].get_text(strip=True)
-                            # Match "1 x Item Name"
-                            item_match = re.match(r'^(\d+)\s*x\s+(.+)$', cell_text, re.I)
-                            if item_match:
-                                quantity = int(item_match.group(1))
-                                item_name = item_match.group(2).strip()
-                                items.append({
-                                    "name": item_name,
-                                    "quantity": quantity
-                                })
+
+                        cell_text = cell.get_text(strip=True)
+                        # Match "1 x Item Name"
+                        item_match = _INSTAMART_ITEM_RE.match(cell_text)
+                        if item_match:
+                            quantity = int(item_match.group(1))
+                            item_name = item_match.group(2).strip()
+                            items.append({
+                                "name": item_name,
+                                "quantity": quantity
+                            })
                 elif order_info.get("order_type") == "Dineout":
                      # Dineout Bill Details -> Items
                      # Parse the "Bill Details" table
-                     bill_header = soup.find(string=re.compile(r'Bill\s*Details', re.I))
+                     bill_header = soup.find(string=_BILL_DETAILS_LABEL_RE)
                      if bill_header:
                          # Find the table containing this header
                          table = bill_header.find_parent('table')
                          if table:
-                             for row in table.find_all('tr'):
-                                 cells = row.find_all('td')
+                             # Bill Details is a short fixed table (bill, discounts, taxes,
+                             # total paid); 64 rows is a generous ceiling
+                             for row in table.find_all('tr', limit=64):
+                                 cells = row.find_all('td', recursive=False)
                                  if len(cells) >= 2:
                                      name = cells[0].get_text(strip=True)
                                      value_text = cells[1].get_text(strip=True)
@@ -826,7 +1594,7 @@ class EmailClient:
                                          
                                      # Check specific rows to extract main amount
                                      if "Total Paid" in name:
-                                         amount_match = re.search(r'₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', value_text)
+                                         amount_match = _RUPEE_AMOUNT_RE.search(value_text)
                                          if amount_match:
                                              order_info["amount"] = amount_match.group(1).replace(',', '')
                                          continue
@@ -836,28 +1604,28 @@ class EmailClient:
                              
                              # Also try to extract Restaurant Name from "Paid to:" pattern if not found
                              if "restaurant_name" not in order_info:
-                                 paid_to_match = re.search(r'Paid\s+to:\s*([^,]+)', plain_text, re.I)
+                                 paid_to_match = _DINEOUT_PAID_TO_RE.search(plain_text)
                                  if paid_to_match:
                                      order_info["restaurant_name"] = paid_to_match.group(1).strip()
                                      
                              # Try to extract address from "Paid to:" line
                              # Stop at "Here are the details" or newline
-                             paid_to_full = re.search(r'Paid\s+to:\s*(.*?)(?:\s+Here\s+are\s+the\s+details|\n|$)', plain_text, re.I)
+                             paid_to_full = _DINEOUT_PAID_TO_LINE_RE.search(plain_text)
                              if paid_to_full:
                                  full_addr = paid_to_full.group(1).strip()
                                  # If it contains commas, assume parts after first comma are address
-                                 parts = full_addr.split(',', 1)
-                                 if len(parts) > 1:
-                                     addr_clean = parts[1].strip()
+                                 _, sep, tail = full_addr.partition(',')
+                                 if sep:
+                                     addr_clean = tail.strip()
                                      # Truncate if it's still too long (likely captured garbage)
                                      if len(addr_clean) > 100:
-                                         addr_clean = addr_clean[:100] + "..."
+                                         addr_clean = f"{addr_clean[:100]}..."
                                      order_info["delivery_address"] = addr_clean
 
                 else:
                     # Food Delivery items extraction
                     # Pattern: Table with header containing "Item Name", "Quantity", "Price"
-                    item_header = soup.find('th', string=re.compile(r'Item\s+Name', re.I))
+                    item_header = soup.find('th', string=_ITEM_NAME_HEADER_RE)
                     if item_header:
                         table = item_header.find_parent('table')
                         if table:
@@ -868,12 +1636,7 @@ class EmailClient:
                                     item_name = cells[0].get_text(strip=True)
                                     # Filter out cost breakdown rows (Item Total, Platform Fee, etc.)
                                     # Only include actual food items
-                                    cost_keywords = [
-                                        'total', 'fee', 'discount', 'tax', 'taxes', 'paid', 
-                                        'packaging', 'delivery', 'applied', 'charge', 'gst',
-                                        'cgst', 'sgst', 'igst', 'subtotal', 'grand total'
-                                    ]
-                                    is_cost_row = any(keyword in item_name.lower() for keyword in cost_keywords)
+                                    is_cost_row = bool(_COST_KEYWORDS_RE.search(item_name))
                                     
                                     # Check if there's a quantity or price
                                     if item_name and len(item_name) < 100 and not is_cost_row:
@@ -881,7 +1644,7 @@ class EmailClient:
                                         quantity = 1
                                         if len(cells) >= 3:
                                             qty_text = cells[1].get_text(strip=True)
-                                            qty_match = re.search(r'(\d+)', qty_text)
+                                            qty_match = _FIRST_NUMBER_RE.search(qty_text)
                                             if qty_match:
                                                 quantity = int(qty_match.group(1))
                                         
@@ -894,42 +1657,42 @@ class EmailClient:
                     order_info["items"] = items
 
                 # Extract savings/discount (Swiggy Dineout specific)
-                savings_match = re.search(r'You saved Rs\.\s*(\d+(?:,\d+)*)', plain_text, re.I)
+                savings_match = _DINEOUT_SAVINGS_RE.search(plain_text)
                 if savings_match:
                     order_info["savings"] = savings_match.group(1).replace(',', '')
                 
                 # Extract number of diners (Swiggy Dineout specific)
-                diners_match = re.search(r'for\s+(\d+)\s+(?:people|diners)', plain_text, re.I)
+                diners_match = _DINEOUT_DINERS_RE.search(plain_text)
                 if diners_match:
                     order_info["num_diners"] = int(diners_match.group(1))
                 
             else:
                 # Fallback to regex parsing if BeautifulSoup is not available
-                plain_text = re.sub(r'<[^>]+>', ' ', html_content)
+                plain_text = _HTML_TAG_RE.sub(' ', html_content)
                 
                 # Detect Instamart
-                if 'instamart' in plain_text.lower():
+                if 'instamart' in html_lower:
                     order_info["order_type"] = "Instamart"
                     order_info["restaurant_name"] = "Swiggy Instamart"
                 
                 # Extract restaurant name (if not Instamart)
                 if "restaurant_name" not in order_info:
-                    restaurant_match = re.search(r'Restaurant\s*</p>\s*<h5[^>]*>([^<]+)</h5>', html_content, re.I)
+                    restaurant_match = _SWIGGY_RESTAURANT_H5_RE.search(html_content)
                     if restaurant_match:
                         order_info["restaurant_name"] = restaurant_match.group(1).strip()
                 
                 # Extract amount from grand-total
-                amount_match = re.search(r'class="grand-total"[^>]*>.*?<td[^>]*>\s*₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', html_content, re.I | re.DOTALL)
+                amount_match = _SWIGGY_GRAND_TOTAL_ROW_RE.search(html_content)
                 if amount_match:
                     order_info["amount"] = amount_match.group(1).replace(',', '')
                 else:
                     # Fallback for Instamart
-                     amount_match = re.search(r'Grand\s*Total.*?₹?\s*(\d+(?:,\d+)*(?:\.\d{2})?)', plain_text, re.I | re.DOTALL)
+                     amount_match = _SWIGGY_GRAND_TOTAL_TEXT_RE.search(plain_text)
                      if amount_match:
                         order_info["amount"] = amount_match.group(1).replace(',', '')
                 
                 # Extract order ID
-                order_id_match = re.search(r'Order\s*(?:#|No\.?|ID)?[:\s]*(\d+)', plain_text, re.I)
+                order_id_match = _SWIGGY_ORDER_ID_RE.search(plain_text)
                 if order_id_match:
                     order_info["order_id"] = order_id_match.group(1)
         
@@ -941,113 +1704,178 @@ class EmailClient:
 
     def _detect_merchant_info(self, subject: str, sender: str, body: str) -> Optional[dict[str, Any]]:
         """Detect merchant type and extract basic info from email"""
-        merchant_info = None
+        # Check subject only for merchant patterns (sender can cause false positives)
+        match = _match_merchant(subject.lower())
+        if not match:
+            return None
         
-        # Define merchant patterns
-        merchants = {
-            'uber': {'type': 'ride_sharing', 'patterns': ['uber']},
-            'ola': {'type': 'ride_sharing', 'patterns': ['ola', 'olacabs']},
-            'swiggy': {'type': 'food_delivery', 'patterns': ['swiggy', 'instamart']},
-            'zomato': {'type': 'food_delivery', 'patterns': ['zomato']},
-            'amazon': {'type': 'ecommerce', 'patterns': ['amazon']},
-            'flipkart': {'type': 'ecommerce', 'patterns': ['flipkart']},
-            'bigbasket': {'type': 'ecommerce', 'patterns': ['bigbasket']},
-            'myntra': {'type': 'ecommerce', 'patterns': ['myntra']},
-            'paytm': {'type': 'other', 'patterns': ['paytm']},
-            'phonepe': {'type': 'other', 'patterns': ['phonepe']},
+        merchant_name, merchant_type = match
+        merchant_info = {
+            'merchant_name': merchant_name,
+            'merchant_type': merchant_type
         }
         
-        # Check subject only for merchant patterns (sender can cause false positives)
-        combined_text = subject.lower()
+        # Try to extract order/transaction ID
+        order_id_match = _MERCHANT_ORDER_ID_RE.search(subject)
+        if order_id_match:
+            merchant_info['order_id'] = order_id_match.group(1)
         
-        for merchant_name, merchant_data in merchants.items():
-            for pattern in merchant_data['patterns']:
-                if pattern in combined_text:
-                    merchant_info = {
-                        'merchant_name': merchant_name.capitalize(),
-                        'merchant_type': merchant_data['type']
-                    }
-                    
-                    # Try to extract order/transaction ID
-                    order_id_match = re.search(r'(?:Order|Transaction|Trip|Booking)\s*(?:#|ID|No\.?)?[:\s]*([A-Z0-9-]+)', subject, re.I)
-                    if order_id_match:
-                        merchant_info['order_id'] = order_id_match.group(1)
-                    
-                    return merchant_info
-        
-        return None
-
+        return merchant_info
 
     def _extract_attachments(self, payload: dict) -> List[dict]:
         """Extract attachment information from Gmail message payload"""
         attachments = []
-        
-        def _process_part(part):
-            if part.get("filename") and part.get("body", {}).get("attachmentId"):
-                attachments.append({
+        # Iterative pre-order walk over the MIME tree; children are pushed in
+        # reverse so attachments come out in the same order as they appear.
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            body = part.get("body") or {}
+            if part.get("filename") and (body.get("attachmentId") or body.get("data")):
+                attachment = {
                     "filename": part["filename"],
                     "mime_type": part.get("mimeType", ""),
-                    "size": part.get("body", {}).get("size", 0),
-                    "attachment_id": part["body"]["attachmentId"]
-                })
+                    "size": body.get("size", 0),
+                    "attachment_id": body.get("attachmentId"),
+                }
+                # Small attachments come inline in format="full" responses;
+                # pass this to the download_attachment* methods to skip attachments.get
+                if body.get("data"):
+                    attachment["inline_data"] = body["data"]
+                attachments.append(attachment)
             
-            if "parts" in part:
-                for subpart in part["parts"]:
-                    _process_part(subpart)
+            parts = part.get("parts")
+            if parts:
+                stack.extend(reversed(parts))
         
-        _process_part(payload)
         return attachments
 
-    def download_attachment(self, message_id: str, attachment_id: str) -> bytes:
-        """Download attachment content"""
+    def download_attachment(self, message_id: str, attachment_id: Optional[str], inline_data: Optional[str] = None) -> bytes:
+        """Download attachment content; ``inline_data`` (from the message payload) is decoded without a request"""
+        if inline_data:
+            return _b64url_decode(inline_data)
         if not self._refresh_credentials():
             raise Exception("Failed to authenticate with Gmail")
 
         try:
-            attachment = (
+            attachment = self._execute(
                 self.service.users()
                 .messages()
                 .attachments()
                 .get(userId="me", messageId=message_id, id=attachment_id)
-                .execute()
             )
             
             data = attachment["data"]
-            return base64.urlsafe_b64decode(data)
+            return _b64url_decode(data)
         except Exception:
             logger.error(f"Error downloading attachment {attachment_id}", exc_info=True)
             raise
 
-    def search_emails_by_date_range(self, start_date: str, end_date: str, query: str = "") -> List[dict[str, Any]]:
+    async def download_attachment_async(self, message_id: str, attachment_id: Optional[str], inline_data: Optional[str] = None) -> bytes:
+        """Async variant of download_attachment; the Gmail I/O runs off the event loop"""
+        return await asyncio.to_thread(self.download_attachment, message_id, attachment_id, inline_data)
+
+    def download_attachment_chunks(self, message_id: str, attachment_id: Optional[str], inline_data: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Download attachment content as decoded chunks.
+
+        Gmail returns the whole attachment base64-encoded in one response, but
+        decoding it piecewise means the decoded copy never has to be fully
+        resident; pass the result straight to the save helpers. With
+        ``inline_data`` no request is made.
+        """
+        if inline_data:
+            return _b64url_decode_chunks(inline_data)
+        if not self._refresh_credentials():
+            raise Exception("Failed to authenticate with Gmail")
+
+        try:
+            attachment = self._execute(
+                self.service.users()
+                .messages()
+                .attachments()
+                .get(userId="me", messageId=message_id, id=attachment_id)
+            )
+        except Exception:
+            logger.error(f"Error downloading attachment {attachment_id}", exc_info=True)
+            raise
+        return _b64url_decode_chunks(attachment["data"])
+
+    def download_attachment_to_file(
+        self, message_id: str, attachment_id: Optional[str], path: Union[str, Path], inline_data: Optional[str] = None
+    ) -> int:
+        """
+        Stream an attachment to ``path`` and return the number of bytes written.
+
+        Gmail has no media download for attachments, so the base64 response is
+        still fetched whole, but the decoded bytes go to disk chunk by chunk and
+        the file appears atomically.
+        """
+        return _write_file(path, self.download_attachment_chunks(message_id, attachment_id, inline_data))
+
+    async def download_attachment_to_file_async(
+        self, message_id: str, attachment_id: Optional[str], path: Union[str, Path], inline_data: Optional[str] = None
+    ) -> int:
+        """Async variant of download_attachment_to_file; the Gmail and disk I/O run off the event loop"""
+        return await asyncio.to_thread(self.download_attachment_to_file, message_id, attachment_id, path, inline_data)
+
+    def search_emails_by_date_range(
+        self, start_date: str, end_date: str, query: str = "", use_cache: bool = False, max_results: Optional[int] = 100
+    ) -> List[dict[str, Any]]:
         """
         Search emails within a date range with optional query
         
         Note: Gmail's 'before:' operator is exclusive, so we add 1 day to end_date
         to include emails on the end_date itself.
+
+        With ``use_cache=True`` an identical search made within the last
+        ``_SEARCH_CACHE_TTL`` seconds is answered from memory instead of Gmail.
+        Results follow Gmail's pagination up to ``max_results`` (None = all).
         """
+        cache_key = (start_date, end_date, query, max_results)
+        if use_cache:
+            with self._search_cache_lock:
+                cached = self._search_cache.get(cache_key)
+                if cached and time.monotonic() - cached[0] < _SEARCH_CACHE_TTL:
+                    self._search_cache.move_to_end(cache_key)
+                    return list(cached[1])
+
         if not self._refresh_credentials():
             raise Exception("Failed to authenticate with Gmail")
 
         # Gmail's 'before:' is exclusive, so add 1 day to include the end_date
-        from datetime import datetime, timedelta
-        end_date_obj = datetime.strptime(end_date, "%Y/%m/%d")
-        end_date_inclusive = (end_date_obj + timedelta(days=1)).strftime("%Y/%m/%d")
+        end_date_obj = datetime.strptime(end_date, _GMAIL_DATE_FMT)
+        end_date_inclusive = (end_date_obj + timedelta(days=1)).strftime(_GMAIL_DATE_FMT)
         
         date_query = f"after:{start_date} before:{end_date_inclusive}"
         full_query = f"{date_query} {query}".strip()
         
         try:
-            resp = (
-                self.service.users()
-                .messages()
-                .list(userId="me", q=full_query, maxResults=100)
-                .execute()
-            )
-            return resp.get("messages", [])
+            messages = self._list_messages(full_query, max_results)
+            if use_cache:
+                with self._search_cache_lock:
+                    self._search_cache.pop(cache_key, None)
+                    self._search_cache[cache_key] = (time.monotonic(), list(messages))
+                    while len(self._search_cache) > _SEARCH_CACHE_SIZE:
+                        self._search_cache.popitem(last=False)
+            return messages
         except Exception:
             logger.error("Error searching emails", exc_info=True)
             raise
 
+    def invalidate_search_cache(self) -> None:
+        """Forget cached search listings so the next use_cache search goes to Gmail."""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+
+    async def search_emails_by_date_range_async(
+        self, start_date: str, end_date: str, query: str = "", use_cache: bool = False, max_results: Optional[int] = 100
+    ) -> List[dict[str, Any]]:
+        """Async variant of search_emails_by_date_range; the Gmail I/O runs off the event loop"""
+        return await asyncio.to_thread(
+            self.search_emails_by_date_range, start_date, end_date, query, use_cache, max_results
+        )
+
     def search_emails_for_transaction(
         self,
         transaction_date: str,
@@ -1092,15 +1920,14 @@ class EmailClient:
             raise Exception("Failed to authenticate with Gmail")
         
         try:
-            # Parse transaction date
-            from datetime import datetime as dt
-            trans_date = dt.strptime(transaction_date.split()[0], "%Y-%m-%d") if " " in transaction_date else dt.strptime(transaction_date, "%Y-%m-%d")
+            # Parse transaction date (drop any time component)
+            trans_date = datetime.strptime(transaction_date.split()[0], _ISO_DATE_FMT)
             
             # Build date range
             if start_date and end_date:
                 # Use custom dates
-                start = dt.strptime(start_date, "%Y-%m-%d")
-                end = dt.strptime(end_date, "%Y-%m-%d")
+                start = datetime.strptime(start_date, _ISO_DATE_FMT)
+                end = datetime.strptime(end_date, _ISO_DATE_FMT)
             else:
                 # Use offset from transaction date
                 start = trans_date - timedelta(days=date_offset_days)
@@ -1109,91 +1936,59 @@ class EmailClient:
                 end = trans_date + timedelta(days=max(date_offset_days, 1))
             
             # Format dates for Gmail query (YYYY/MM/DD)
-            start_str = start.strftime("%Y/%m/%d")
-            end_str = end.strftime("%Y/%m/%d")
+            start_str = start.strftime(_GMAIL_DATE_FMT)
+            end_str = end.strftime(_GMAIL_DATE_FMT)
             date_query = f"after:{start_str} before:{end_str}"
             
-            # Build search query
-            query_parts = [date_query]
-            
-            # Add custom search term if provided
-            if custom_search_term:
-                query_parts.append(custom_search_term)
-            
             # Add amount filter if enabled
+            amount_query = ""
             if include_amount_filter:
                 # Use search_amount if provided, otherwise use transaction_amount
                 amount_to_search = search_amount if search_amount is not None else abs(transaction_amount)
 
-                # Format the base amount string
-                if amount_to_search == int(amount_to_search):
-                    amount_str = str(int(amount_to_search))
-                else:
-                    amount_str = str(amount_to_search)
-
                 # Build amount search query
                 if amount_tolerance and amount_tolerance > 0:
                     # Range query: search for all integer amounts from (amount - tolerance) to amount
                     base = int(amount_to_search)
                     lower = max(0, base - amount_tolerance)
                     range_terms = " OR ".join(f'"{v}"' for v in range(lower, base + 1))
-                    query_parts.append(f"({range_terms})")
+                    amount_query = f"({range_terms})"
                 elif also_search_amount_minus_one:
                     # Search for either amount or amount-1 (legacy UPI rounding helper)
-                    amount_minus_one = amount_to_search - 1
-                    if amount_minus_one == int(amount_minus_one):
-                        amount_minus_one_str = str(int(amount_minus_one))
-                    else:
-                        amount_minus_one_str = str(amount_minus_one)
-                    query_parts.append(f'("{amount_str}" OR "{amount_minus_one_str}")')
+                    amount_query = f'("{_format_amount(amount_to_search)}" OR "{_format_amount(amount_to_search - 1)}")'
                 else:
                     # Exact amount only
-                    query_parts.append(f'"{amount_str}"')
+                    amount_query = f'"{_format_amount(amount_to_search)}"'
             
-            # Build final query
-            full_query = " ".join(query_parts)
+            # Build final query: date range, then custom search term, then amount filter
+            full_query = date_query
+            if custom_search_term:
+                full_query = f"{full_query} {custom_search_term}"
+            if amount_query:
+                full_query = f"{full_query} {amount_query}"
             
             logger.info(f"Searching emails with query: {full_query}")
             
             # Search for messages
-            resp = (
-                self.service.users()
-                .messages()
-                .list(userId="me", q=full_query, maxResults=50)
-                .execute()
-            )
-            
-            messages = resp.get("messages", [])
+            messages = self._list_messages(full_query, 50)
             logger.info(f"Found {len(messages)} matching emails")
             
-            # Get detailed information for each message
+            # Get subject/sender/date for every hit in batched metadata requests
+            metadata = self._get_listing_metadata([msg["id"] for msg in messages])
             email_results = []
             for msg in messages:
-                try:
-                    # Get message details
-                    message = (
-                        self.service.users()
-                        .messages()
-                        .get(userId="me", id=msg["id"], format="metadata", metadataHeaders=["Subject", "From", "Date"])
-                        .execute()
-                    )
-                    
-                    # Extract headers
-                    headers = message.get("payload", {}).get("headers", [])
-                    subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
-                    sender = next((h["value"] for h in headers if h["name"] == "From"), "")
-                    date = next((h["value"] for h in headers if h["name"] == "Date"), "")
-                    
-                    email_results.append({
-                        "id": msg["id"],
-                        "subject": subject,
-                        "sender": sender,
-                        "date": date,
-                        "snippet": message.get("snippet", "")
-                    })
-                except Exception as e:
-                    logger.warning(f"Failed to get details for message {msg.get('id')}: {e}")
+                message = metadata.get(msg["id"])
+                if message is None:
+                    # Failed in the batch and on the individual retry (already logged)
                     continue
+                hdrs = _index_headers(message.get("payload", {}).get("headers", []))
+                email_results.append({
+                    "id": msg["id"],
+                    "subject": hdrs.get("subject", ""),
+                    "sender": hdrs.get("from", ""),
+                    "date": hdrs.get("date", ""),
+                    "snippet": message.get("snippet", "")
+                })
             
             # Post-search body-amount verification
             if verify_body_amount:
@@ -1252,18 +2047,17 @@ class EmailClient:
             raise Exception("Failed to authenticate with Gmail")
 
         try:
-            thread = (
+            thread = self._execute(
                 self.service.users()
                 .threads()
                 .get(userId="me", id=thread_id)
-                .execute()
             )
             return thread
         except Exception:
             logger.error(f"Error getting email thread {thread_id}", exc_info=True)
             raise
 
-    def download_latest_attachment_with_normalized_name(self, sender_email: str, file_type: str = "pdf", download_dir: str = "data/statements/locked_statements") -> Optional[dict[str, Any]]:
+    def download_latest_attachment_with_normalized_name(self, sender_email: str, file_type: str = "pdf", download_dir: str = "data/statements/locked_statements", persist: bool = True) -> Optional[dict[str, Any]]:
         """
         Download the latest attachment from a specific sender with normalized filename
         
@@ -1271,6 +2065,9 @@ class EmailClient:
             sender_email: Email address of the sender
             file_type: Type of file to download (default: pdf)
             download_dir: Directory to save the attachment
+            persist: Write the attachment to download_dir. When False nothing is
+                written; the result carries the bytes in "attachment_data" and
+                "saved_path" is None.
             
         Returns:
             Dictionary containing download results, or None if failed
@@ -1278,19 +2075,23 @@ class EmailClient:
         try:
             logger.info(f"📧 Searching for latest email from: {sender_email}")
             
-            # Search for emails from this sender
-            query = f"from:{sender_email}"
+            # Search for emails from this sender that carry a matching attachment;
+            # Gmail's index skips messages we'd otherwise fetch and discard
+            query = f"from:{sender_email} has:attachment filename:{file_type}"
             emails = self.search_emails_by_date_range(
                 start_date="2025/01/01",  # Start from beginning of year
                 end_date="2025/12/31",    # End of year
-                query=query
+                query=query,
+                use_cache=True,
+                # Gmail lists newest first, and only the latest is used
+                max_results=1,
             )
             
             if not emails:
                 logger.warning(f"No emails found from {sender_email}")
                 return None
             
-            logger.info(f"✅ Found {len(emails)} emails from {sender_email}")
+            logger.info(f"✅ Found latest email from {sender_email}")
             
             # Get the latest email (first in the list)
             latest_email = emails[0]
@@ -1344,22 +2145,36 @@ class EmailClient:
             
             logger.info(f"⬇️ Downloading: {original_filename}")
             
-            # Download attachment data
-            attachment_data = self.download_attachment(email_id, attachment_id)
-            if not attachment_data:
-                logger.error("Failed to download attachment data")
+            # Generate normalized filename
+            normalized_filename = self._generate_normalized_filename(sender_email, date, file_type)
+            
+            if not persist:
+                # Caller parses the bytes in memory; skip the disk round-trip
+                attachment_data = self.download_attachment(email_id, attachment_id, attachment.get("inline_data"))
+                if not attachment_data:
+                    logger.error("Failed to download attachment data")
+                    return {
+                        "success": False,
+                        "error": "Failed to download attachment data",
+                        "email_subject": subject,
+                        "email_date": date
+                    }
                 return {
-                    "success": False,
-                    "error": "Failed to download attachment data",
+                    "success": True,
                     "email_subject": subject,
-                    "email_date": date
+                    "email_date": date,
+                    "original_filename": original_filename,
+                    "normalized_filename": normalized_filename,
+                    "saved_path": None,
+                    "attachment_data": attachment_data,
+                    "file_size": len(attachment_data)
                 }
             
-            # Generate normalized filename
-            normalized_filename = self._generate_normalized_filename(sender_email, date, file_type)
+            # Download attachment data as decoded chunks, streamed to disk below
+            attachment_chunks = self.download_attachment_chunks(email_id, attachment_id, attachment.get("inline_data"))
             
             # Save attachment to file
-            saved_path = self._save_attachment_with_normalized_name(normalized_filename, attachment_data, download_dir)
+            saved_path = self._save_attachment_with_normalized_name(normalized_filename, attachment_chunks, download_dir)
             if not saved_path:
                 logger.error("Failed to save attachment")
                 return {
@@ -1369,6 +2184,17 @@ class EmailClient:
                     "email_date": date
                 }
             
+            file_size = os.path.getsize(saved_path)
+            if not file_size:
+                logger.error("Failed to download attachment data")
+                os.remove(saved_path)
+                return {
+                    "success": False,
+                    "error": "Failed to download attachment data",
+                    "email_subject": subject,
+                    "email_date": date
+                }
+            
             logger.info(f"💾 Attachment saved to: {saved_path}")
             
             return {
@@ -1378,7 +2204,7 @@ class EmailClient:
                 "original_filename": original_filename,
                 "normalized_filename": normalized_filename,
                 "saved_path": saved_path,
-                "file_size": len(attachment_data)
+                "file_size": file_size
             }
             
         except Exception as e:
@@ -1388,70 +2214,137 @@ class EmailClient:
                 "error": str(e)
             }
 
+    def download_latest_attachments_bulk(
+        self,
+        sender_emails: List[str],
+        file_type: str = "pdf",
+        download_dir: str = "data/statements/locked_statements",
+        max_workers: int = 8,
+    ) -> List[Optional[dict[str, Any]]]:
+        """
+        Run download_latest_attachment_with_normalized_name for many senders at once.
+
+        Each sender's search, fetch and download run on a worker thread (Gmail
+        calls go through _execute, so every thread has its own connection).
+        Returns one result per sender, in input order.
+        """
+        if len(sender_emails) <= 1:
+            return [
+                self.download_latest_attachment_with_normalized_name(sender, file_type, download_dir)
+                for sender in sender_emails
+            ]
+        if not self._refresh_credentials():
+            raise Exception("Failed to authenticate with Gmail")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(sender_emails)), thread_name_prefix="gmail-download") as pool:
+            return list(pool.map(
+                lambda sender: self.download_latest_attachment_with_normalized_name(sender, file_type, download_dir),
+                sender_emails,
+            ))
+
+    async def download_latest_attachments_bulk_async(
+        self,
+        sender_emails: List[str],
+        file_type: str = "pdf",
+        download_dir: str = "data/statements/locked_statements",
+        max_workers: int = 8,
+    ) -> List[Optional[dict[str, Any]]]:
+        """Async variant of download_latest_attachments_bulk; the Gmail and disk I/O run off the event loop"""
+        return await asyncio.to_thread(
+            self.download_latest_attachments_bulk, sender_emails, file_type, download_dir, max_workers
+        )
+
     def _generate_normalized_filename(self, sender_email: str, email_date: str, file_type: str) -> str:
         """Generate normalized filename using account nickname and email date"""
+        return self._generate_normalized_filenames([(sender_email, email_date, file_type)])[0]
+
+    def _generate_normalized_filenames(self, jobs: List[Tuple[str, str, str]]) -> List[str]:
+        """
+        Generate normalized filenames for many (sender_email, email_date, file_type) jobs.
+
+        All nicknames are resolved with one DB round-trip before formatting;
+        any job that can't be named falls back to a timestamped filename.
+        """
         try:
-            # Get account nickname from database
-            # Run async function in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # Get account nicknames from database
+            nicknames = _lookup_account_nicknames(sender for sender, _, _ in jobs)
+        except Exception:
+            logger.error("Error looking up account nicknames", exc_info=True)
+            return [self._timestamped_filename(file_type) for _, _, file_type in jobs]
+
+        filenames = []
+        for sender_email, email_date, file_type in jobs:
             try:
-                nickname = loop.run_until_complete(
-                    AccountOperations.get_account_nickname_by_sender(sender_email)
+                filenames.append(
+                    self._format_normalized_filename(sender_email, nicknames.get(sender_email), email_date, file_type)
                 )
-            finally:
-                loop.close()
-            
-            # Use nickname if available, otherwise use sender email domain
-            if nickname:
-                # Convert to lowercase and replace spaces with underscores
-                base_name = nickname.lower().replace(' ', '_')
-            else:
-                # Extract domain from email as fallback
-                domain = sender_email.split('@')[1].split('.')[0]
-                base_name = domain.lower()
-            
-            # Parse email date and format it
-            # Try to parse the email date (Gmail format)
-            try:
-                # Remove timezone info and parse
-                date_str = re.sub(r'\s+\([^)]+\)$', '', email_date)
-                parsed_date = datetime.strptime(date_str, "%a, %d %b %Y %H:%M:%S %z")
-                formatted_date = parsed_date.strftime("%Y%m%d")
             except Exception:
-                # Fallback to current date if parsing fails
-                formatted_date = datetime.now().strftime("%Y%m%d")
-                logger.warning(f"Could not parse email date '{email_date}', using current date")
-            
-            # Create normalized filename
-            normalized_filename = f"{base_name}_{formatted_date}.{file_type}"
-            
-            return normalized_filename
-            
-        except Exception:
-            logger.error("Error generating normalized filename", exc_info=True)
-            # Fallback to timestamp-based filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            return f"statement_{timestamp}.{file_type}"
+                logger.error("Error generating normalized filename", exc_info=True)
+                filenames.append(self._timestamped_filename(file_type))
+        return filenames
 
-    def _save_attachment_with_normalized_name(self, filename: str, attachment_data: bytes, download_dir: str) -> Optional[str]:
-        """Save attachment data to file with normalized filename"""
+    def _format_normalized_filename(self, sender_email: str, nickname: Optional[str], email_date: str, file_type: str) -> str:
+        """Build "<nickname>_<YYYYMMDD>.<ext>" from an already-resolved nickname"""
+        # Use nickname if available, otherwise use sender email domain
+        if nickname:
+            # Convert to lowercase and replace spaces with underscores (one pass for ASCII names)
+            base_name = (
+                nickname.translate(_LOWER_UNDERSCORE) if nickname.isascii()
+                else nickname.lower().replace(' ', '_')
+            )
+        else:
+            # Extract domain from email as fallback
+            _, at, host = sender_email.partition('@')
+            if not at:
+                raise ValueError(f"Sender has no domain: {sender_email!r}")
+            base_name = host.partition('.')[0].lower()
+        
+        # Parse email date and format it
+        # Try to parse the email date (Gmail format)
+        formatted_date = _email_date_stamp(email_date)
+        if formatted_date is None:
+            # Fallback to current date if parsing fails
+            formatted_date = datetime.now().strftime("%Y%m%d")
+            logger.warning(f"Could not parse email date '{email_date}', using current date")
+        
+        # Create normalized filename
+        return f"{base_name}_{formatted_date}.{file_type}"
+
+    @staticmethod
+    def _timestamped_filename(file_type: str) -> str:
+        """Fallback to timestamp-based filename"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"statement_{timestamp}.{file_type}"
+
+    def _save_attachment_with_normalized_name(self, filename: str, attachment_data: Union[_BytesLike, Iterable[_BytesLike]], download_dir: str) -> Optional[str]:
+        """Save attachment data (bytes or an iterable of chunks) to file with normalized filename"""
         try:
             # Create output directory
-            download_path = Path(download_dir)
-            download_path.mkdir(parents=True, exist_ok=True)
+            _ensure_dir(download_dir)
             
             # Create file path
-            file_path = download_path / filename
+            file_path = os.path.join(download_dir, filename)
             
-            # Write attachment data
-            with open(file_path, 'wb') as f:
-                f.write(attachment_data)
+            # Write attachment data straight to the fd: one unbuffered write
+            # instead of copying multi-MB PDFs through a BufferedWriter
+            try:
+                _write_file(file_path, attachment_data)
+            except _TempFileOpenError:
+                # Directory was removed since we created it; no chunk was read yet
+                _ensure_dir(download_dir, force=True)
+                _write_file(file_path, attachment_data)
             
-            return str(file_path)
+            return file_path
             
         except Exception:
             logger.error("Error saving attachment", exc_info=True)
             return None
 
 
+@lru_cache(maxsize=None)
+def get_email_client(account_id: str = "primary") -> EmailClient:
+    """Process-wide EmailClient for account_id.
+
+    Reusing one client keeps its authorized connections (and per-thread ones
+    in _execute) open across requests instead of reconnecting each time.
+    """
+    return EmailClient(account_id=account_id)
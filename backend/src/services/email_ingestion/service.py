@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import re
+import sqlite3
+import threading
+import time
+from collections import Counter
 from datetime import datetime
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from src.services.email_ingestion.client import EmailClient
+from src.services.email_ingestion.client import get_email_client
 from src.services.llm_parser.parser import LLMExpenseParser
 from src.utils.logger import get_logger
 from src.utils.settings import get_settings
@@ -16,12 +23,91 @@ except ImportError:
 
 logger = get_logger(__name__)
 
+# Emails sent to the LLM parser at once
+_LLM_CONCURRENCY = 8
+
+# Attachments downloaded at once, and the types worth downloading
+_ATTACHMENT_CONCURRENCY = 8
+_PROCESSABLE_ATTACHMENT_TYPES = frozenset({"application/pdf", "image/jpeg", "image/png"})
+
+# Domain part of a From header ("Bank <alerts@bank.com>" -> "bank.com")
+_SENDER_DOMAIN_RE = re.compile(r'@([^>]+)')
+
+# backend/, which a relative PROCESSED_EMAILS_DB_PATH is resolved against
+_BACKEND_DIR = Path(__file__).resolve().parents[3]
+# Message IDs per "IN (...)" lookup, under SQLite's bound-parameter limit
+_SQLITE_LOOKUP_CHUNK = 500
+
+
+def _processed_emails_db_path() -> Path:
+    path = Path(get_settings().PROCESSED_EMAILS_DB_PATH)
+    return path if path.is_absolute() else _BACKEND_DIR / path
+
+
+class ProcessedEmailStore:
+    """
+    SQLite table of (account, message ID) -> extracted expense JSON (NULL when the email had none).
+
+    Lets re-listed emails skip the fetch and LLM call. The database is opened on
+    first use, and one lock serializes access to the shared connection.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Callers hold self._lock
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_emails ("
+                "account_id TEXT NOT NULL, message_id TEXT NOT NULL, expense_json TEXT, processed_at REAL NOT NULL, "
+                "PRIMARY KEY (account_id, message_id))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, account_id: str, message_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Stored results for whichever of message_ids were processed before."""
+        found: Dict[str, Optional[Dict[str, Any]]] = {}
+        unique_ids = list(dict.fromkeys(message_ids))
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(unique_ids), _SQLITE_LOOKUP_CHUNK):
+                chunk = unique_ids[start:start + _SQLITE_LOOKUP_CHUNK]
+                rows = conn.execute(
+                    "SELECT message_id, expense_json FROM processed_emails "
+                    f"WHERE account_id = ? AND message_id IN ({','.join('?' * len(chunk))})",
+                    [account_id, *chunk],
+                )
+                for message_id, expense_json in rows:
+                    found[message_id] = json.loads(expense_json) if expense_json else None
+        return found
+
+    def record(self, account_id: str, results: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Remember extraction results (None = no expense in that email)."""
+        processed_at = time.time()
+        rows = [
+            (account_id, message_id, json.dumps(expense_data, default=str) if expense_data else None, processed_at)
+            for message_id, expense_data in results.items()
+        ]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO processed_emails VALUES (?, ?, ?, ?)", rows)
+
 
 class EmailIngestionService:
-    def __init__(self, account_id: str = "primary"):
+    def __init__(self, account_id: str = "primary", processed_emails: Optional[ProcessedEmailStore] = None):
         self.account_id = account_id
-        self.email_client = EmailClient(account_id=account_id)
+        self.email_client = get_email_client(account_id)
         self.llm_parser = LLMExpenseParser()
+        self.processed_emails = processed_emails or ProcessedEmailStore(_processed_emails_db_path())
 
     async def ingest_recent_transaction_emails(self, max_results: int = 25, days_back: int = 7) -> Dict[str, Any]:
         """Ingest recent transaction emails and extract expense data"""
@@ -40,29 +126,23 @@ class EmailIngestionService:
             error_count = 0
             extracted_expenses = []
             
-            # Process each email
-            for message in messages:
-                try:
-                    processed_count += 1
-                    logger.info(f"Processing email {processed_count}/{len(messages)}: {message.get('id')}")
-                    
-                    # Get full email content
-                    email_content = self.email_client.get_email_content(message['id'])
-                    
-                    # Extract expense data from email
-                    expense_data = await self._extract_expense_from_email(email_content)
-                    
-                    if expense_data:
-                        extracted_count += 1
-                        extracted_expenses.append(expense_data)
-                        logger.info(f"Successfully extracted expense: {expense_data.get('amount', 'N/A')} - {expense_data.get('description', 'N/A')}")
-                    else:
-                        logger.info(f"No expense data found in email: {email_content.get('subject', 'N/A')}")
-                        
-                except Exception:
+            # Extract expense data from the emails concurrently
+            logger.info(f"Processing {len(messages)} emails")
+            expense_results = await self._process_messages(messages)
+            
+            for message, expense_data in zip(messages, expense_results):
+                processed_count += 1
+                if isinstance(expense_data, Exception):
                     error_count += 1
-                    logger.error(f"Error processing email {message.get('id')}", exc_info=True)
+                    logger.error(f"Error processing email {message.get('id')}", exc_info=expense_data)
                     continue
+                
+                if expense_data:
+                    extracted_count += 1
+                    extracted_expenses.append(expense_data)
+                    logger.info(f"Successfully extracted expense: {expense_data.get('amount', 'N/A')} - {expense_data.get('description', 'N/A')}")
+                else:
+                    logger.info(f"No expense data found in email: {message.get('id')}")
             
             logger.info(f"Email ingestion completed. Processed: {processed_count}, Extracted: {extracted_count}, Errors: {error_count}")
             
@@ -77,39 +157,92 @@ class EmailIngestionService:
             logger.error("Error in email ingestion", exc_info=True)
             raise
 
-    async def _extract_expense_from_email(self, email_content: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Extract expense information from email content using LLM"""
+    async def _process_messages(self, messages: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Expense result for each message, in order (see _extract_expenses).
+
+        Emails an earlier run already handled are answered from the processed-email
+        store without fetching them or calling the LLM parser.
+        """
+        message_ids = [message['id'] for message in messages]
         try:
-            # Prepare email data for LLM processing
-            email_data = {
-                "subject": email_content.get("subject", ""),
-                "sender": email_content.get("sender", ""),
-                "body": email_content.get("body", ""),
-                "date": email_content.get("date", ""),
-                "attachments": email_content.get("attachments", [])
-            }
-            
-            # Use LLM to extract expense data
-            expense_data = await self.llm_parser.extract_expense_from_email(email_data)
-            
-            if expense_data and expense_data.get("amount"):
-                # Add metadata
-                expense_data.update({
-                    "source": "email",
-                    "email_id": email_content.get("id"),
-                    "email_subject": email_content.get("subject"),
-                    "email_sender": email_content.get("sender"),
-                    "email_date": email_content.get("date"),
-                    "extracted_at": datetime.now().isoformat()
-                })
-                
-                return expense_data
-            
-            return None
-            
+            results: Dict[str, Any] = self.processed_emails.lookup(self.account_id, message_ids)
         except Exception:
-            logger.error("Error extracting expense from email", exc_info=True)
-            return None
+            logger.warning("Processed-email lookup failed, processing every email", exc_info=True)
+            results = {}
+        if results:
+            logger.info(f"Skipping {len(results)} already processed emails")
+
+        new_messages = list({message['id']: message for message in messages if message['id'] not in results}.values())
+        if new_messages:
+            # Fetch every new email in batched requests up front; a missing ID failed to fetch
+            email_contents = await self.email_client.get_email_contents_async([message['id'] for message in new_messages])
+            new_results = dict(zip(
+                (message['id'] for message in new_messages),
+                await self._extract_expenses(new_messages, email_contents),
+            ))
+            try:
+                self.processed_emails.record(self.account_id, {
+                    message_id: expense_data for message_id, expense_data in new_results.items()
+                    if not isinstance(expense_data, BaseException)
+                })
+            except Exception:
+                logger.warning("Could not record processed emails", exc_info=True)
+            results.update(new_results)
+
+        return [results[message_id] for message_id in message_ids]
+
+    async def _extract_expenses(
+        self, messages: List[Dict[str, Any]], email_contents: Dict[str, Dict[str, Any]]
+    ) -> List[Any]:
+        """
+        Run _extract_expense_from_email for each message, at most _LLM_CONCURRENCY at a time.
+
+        Returns one entry per message, in order: the expense dict, None, or the
+        exception raised (KeyError when the email couldn't be fetched).
+        """
+        semaphore = asyncio.Semaphore(_LLM_CONCURRENCY)
+
+        async def extract(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            email_content = email_contents[message['id']]
+            async with semaphore:
+                return await self._extract_expense_from_email(email_content)
+
+        return await asyncio.gather(*(extract(message) for message in messages), return_exceptions=True)
+
+    async def _extract_expense_from_email(self, email_content: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Extract expense information from email content using LLM.
+
+        Returns None only when the parser found no expense; parser failures
+        propagate so they are counted as errors and retried on the next run.
+        """
+        # Prepare email data for LLM processing
+        email_data = {
+            "subject": email_content.get("subject", ""),
+            "sender": email_content.get("sender", ""),
+            "body": email_content.get("body", ""),
+            "date": email_content.get("date", ""),
+            "attachments": email_content.get("attachments", [])
+        }
+        
+        # Use LLM to extract expense data
+        expense_data = await self.llm_parser.extract_expense_from_email(email_data)
+        
+        if expense_data and expense_data.get("amount"):
+            # Add metadata
+            expense_data.update({
+                "source": "email",
+                "email_id": email_content.get("id"),
+                "email_subject": email_content.get("subject"),
+                "email_sender": email_content.get("sender"),
+                "email_date": email_content.get("date"),
+                "extracted_at": datetime.now().isoformat()
+            })
+            
+            return expense_data
+        
+        return None
 
     async def search_and_ingest_emails(self, query: str, start_date: str, end_date: str) -> Dict[str, Any]:
         """Search for specific emails and ingest them"""
@@ -128,27 +261,21 @@ class EmailIngestionService:
             error_count = 0
             extracted_expenses = []
             
-            # Process each email
-            for message in messages:
-                try:
-                    processed_count += 1
-                    logger.info(f"Processing search result {processed_count}/{len(messages)}: {message.get('id')}")
-                    
-                    # Get full email content
-                    email_content = self.email_client.get_email_content(message['id'])
-                    
-                    # Extract expense data from email
-                    expense_data = await self._extract_expense_from_email(email_content)
-                    
-                    if expense_data:
-                        extracted_count += 1
-                        extracted_expenses.append(expense_data)
-                        logger.info(f"Successfully extracted expense: {expense_data.get('amount', 'N/A')} - {expense_data.get('description', 'N/A')}")
-                    
-                except Exception:
+            # Extract expense data from the emails concurrently
+            logger.info(f"Processing {len(messages)} search results")
+            expense_results = await self._process_messages(messages)
+            
+            for message, expense_data in zip(messages, expense_results):
+                processed_count += 1
+                if isinstance(expense_data, Exception):
                     error_count += 1
-                    logger.error(f"Error processing search result {message.get('id')}")
+                    logger.error(f"Error processing search result {message.get('id')}", exc_info=expense_data)
                     continue
+                
+                if expense_data:
+                    extracted_count += 1
+                    extracted_expenses.append(expense_data)
+                    logger.info(f"Successfully extracted expense: {expense_data.get('amount', 'N/A')} - {expense_data.get('description', 'N/A')}")
             
             logger.info(f"Search and ingestion completed. Processed: {processed_count}, Extracted: {extracted_count}, Errors: {error_count}")
             
@@ -170,33 +297,31 @@ class EmailIngestionService:
             if not attachments:
                 return []
             
-            processed_attachments = []
+            # Only types we can OCR / parse are worth downloading
+            attachments = [a for a in attachments if a.get("mime_type") in _PROCESSABLE_ATTACHMENT_TYPES]
+            semaphore = asyncio.Semaphore(_ATTACHMENT_CONCURRENCY)
             
-            for attachment in attachments:
+            async def process(attachment: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                 try:
-                    # Download attachment
-                    attachment_data = self.email_client.download_attachment(
-                        email_content["id"], 
-                        attachment["attachment_id"]
-                    )
-                    
-                    # Process attachment based on type
-                    if attachment["mime_type"] in ["application/pdf", "image/jpeg", "image/png"]:
-                        # Use OCR or PDF processing
-                        processed_data = await self._process_attachment_file(
-                            attachment_data, 
-                            attachment["filename"], 
-                            attachment["mime_type"]
+                    async with semaphore:
+                        # Download attachment
+                        attachment_data = await self.email_client.download_attachment_async(
+                            email_content["id"],
+                            attachment["attachment_id"],
+                            attachment.get("inline_data"),
                         )
-                        
-                        if processed_data:
-                            processed_attachments.append(processed_data)
-                    
+                    # Use OCR or PDF processing
+                    return await self._process_attachment_file(
+                        attachment_data, 
+                        attachment["filename"], 
+                        attachment["mime_type"]
+                    )
                 except Exception:
                     logger.error(f"Error processing attachment {attachment.get('filename')}")
-                    continue
+                    return None
             
-            return processed_attachments
+            results = await asyncio.gather(*(process(attachment) for attachment in attachments))
+            return [processed_data for processed_data in results if processed_data]
             
         except Exception:
             logger.error("Error processing email attachments")
@@ -234,27 +359,21 @@ class EmailIngestionService:
         """Get statistics about transaction emails"""
         try:
             # Get emails from different time periods
-            recent_emails = self.email_client.list_recent_transaction_emails(max_results=100, days_back=days_back)
+            # Only the sender is needed, so fetch headers rather than full messages
+            recent_emails = self.email_client.list_recent_transaction_emails(
+                max_results=100, days_back=days_back, include_headers=True
+            )
             
             # Group by sender domain
-            sender_stats = {}
-            for email in recent_emails:
-                try:
-                    email_content = self.email_client.get_email_content(email['id'])
-                    sender = email_content.get('sender', '')
-                    
-                    # Extract domain from email
-                    domain_match = re.search(r'@([^>]+)', sender)
-                    if domain_match:
-                        domain = domain_match.group(1)
-                        sender_stats[domain] = sender_stats.get(domain, 0) + 1
-                except Exception:
-                    logger.error("Error getting email content for stats")
-                    continue
+            sender_stats = Counter(
+                domain_match.group(1)
+                for domain_match in (_SENDER_DOMAIN_RE.search(email.get('sender', '')) for email in recent_emails)
+                if domain_match
+            )
             
             return {
                 "total_emails": len(recent_emails),
-                "sender_statistics": sender_stats,
+                "sender_statistics": dict(sender_stats),
                 "period_days": days_back
             }
             
@@ -9,6 +9,9 @@ This module provides comprehensive token management to minimize Gmail authentica
 5. Automatic re-authentication when needed
 """
 
+import hashlib
+import json
+import os
 import time
 from datetime import datetime
 from pathlib import Path
@@ -73,10 +76,10 @@ class TokenManager:
             return False
         return True
     
-    def _refresh_token_proactively(self, credentials: Credentials) -> bool:
-        """Proactively refresh token before it expires"""
+    def _refresh_token_proactively(self, credentials: Credentials, force: bool = False) -> bool:
+        """Proactively refresh token before it expires (or unconditionally with force)"""
         try:
-            if self._is_token_expired(credentials):
+            if force or self._is_token_expired(credentials):
                 logger.info(f"Proactively refreshing token for {self.account_id} account")
                 credentials.refresh(Request())
                 self.last_refresh_time[self.account_id] = time.time()
@@ -90,16 +93,69 @@ class TokenManager:
             logger.error(f"Unexpected error refreshing token for {self.account_id}", exc_info=True)
             return False
     
+    def _token_cache_path(self) -> Path:
+        """Persisted access token for this account (settings.GMAIL_TOKEN_CACHE_DIR, mode 0600)"""
+        return Path(self.settings.GMAIL_TOKEN_CACHE_DIR).expanduser() / f"gmail_{self.account_id}.json"
+
+    @staticmethod
+    def _refresh_token_fingerprint(refresh_token: Optional[str]) -> str:
+        """Identifies the refresh token a cached access token belongs to without storing it"""
+        return hashlib.sha256((refresh_token or "").encode()).hexdigest()
+
+    def _load_persisted_credentials(self) -> Optional[Credentials]:
+        """Credentials from the on-disk token cache, or None if missing, stale or for another refresh token"""
+        try:
+            with open(self._token_cache_path(), "rb") as f:
+                cached = json.loads(f.read())
+            refresh_token = self._get_token_info()[0]
+            if cached.get("refresh_token_sha256") != self._refresh_token_fingerprint(refresh_token):
+                return None
+            credentials = self._create_credentials(cached["token"])
+            credentials.expiry = datetime.fromisoformat(cached["expiry"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if self._is_token_expired(credentials):
+            return None
+        return credentials
+
+    def _persist_credentials(self, credentials: Credentials) -> None:
+        """Write the access token and expiry to the token cache, readable by the owner only"""
+        if not credentials.token or not credentials.expiry:
+            return
+        path = self._token_cache_path()
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        data = json.dumps({
+            "token": credentials.token,
+            "expiry": credentials.expiry.isoformat(),
+            "refresh_token_sha256": self._refresh_token_fingerprint(credentials.refresh_token),
+        }).encode()
+        try:
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning(f"Could not persist access token for {self.account_id}", exc_info=True)
+
     def get_valid_credentials(self) -> Optional[Credentials]:
-        """Get valid credentials, refreshing if necessary"""
+        """Get valid credentials, reusing a persisted access token or refreshing if necessary"""
         try:
+            credentials = self._load_persisted_credentials()
+            if credentials:
+                return credentials
+
             credentials = self._create_credentials()
             
-            # Try to refresh proactively
-            if not self._refresh_token_proactively(credentials):
+            # Try to refresh proactively; credentials built from the refresh token
+            # have no access token yet, so fetch one now to persist it
+            if not self._refresh_token_proactively(credentials, force=not credentials.token):
                 logger.error(f"Failed to get valid credentials for {self.account_id}")
                 return None
             
+            self._persist_credentials(credentials)
             return credentials
             
         except Exception:
@@ -21,10 +21,9 @@ from typing import Callable, Dict, List, Optional, Any, Set, Tuple
 
 import pandas as pd
 from dateutil.relativedelta import relativedelta
-from googleapiclient.discovery import build
 
 from src.services.database_manager.operations import AccountOperations, StatementLogOperations, TransactionOperations
-from src.services.email_ingestion.client import EmailClient
+from src.services.email_ingestion.client import get_email_client
 from src.services.email_ingestion.token_manager import TokenManager
 from src.services.cloud_storage.gcs_service import GoogleCloudStorageService
 from src.services.statement_processor.document_extractor import DocumentExtractor
@@ -172,10 +171,10 @@ class StatementWorkflow:
         self.enable_secondary_account = enable_secondary_account
         self.event_callback = event_callback
         
-        # Initialize email clients for both accounts
+        # Process-wide email clients for both accounts, shared with the API routes
         self.email_clients = {}
         for account_id in self.account_ids:
-            self.email_clients[account_id] = EmailClient(account_id=account_id)
+            self.email_clients[account_id] = get_email_client(account_id)
         
         self.cloud_storage = GoogleCloudStorageService()
         self.document_extractor = DocumentExtractor()
@@ -190,6 +189,9 @@ class StatementWorkflow:
         # Tracks which Gmail account_ids have already had their token refreshed
         # this run — prevents duplicate refresh logs when called from multiple steps.
         self._refreshed_accounts: set[str] = set()
+        # sender_email -> account nickname (None if no account matches), resolved
+        # once per run instead of once per statement step.
+        self._account_nicknames: Dict[str, Optional[str]] = {}
         logger.info(f"Created temp directory: {self.temp_dir}", extra=self._log_extra())
         logger.info(f"Initialized email clients for accounts: {self.account_ids}", extra=self._log_extra())
         logger.info(f"Secondary account enabled: {self.enable_secondary_account}", extra=self._log_extra())
@@ -281,12 +283,7 @@ class StatementWorkflow:
                     )
                     self._refreshed_accounts.add(account_id)
                     if account_id in self.email_clients:
-                        self.email_clients[account_id].creds = credentials
-                        self.email_clients[account_id].service = build(
-                            "gmail", "v1",
-                            credentials=credentials,
-                            cache_discovery=False,
-                        )
+                        self.email_clients[account_id].set_credentials(credentials)
                     self._emit(
                         "token_refresh_complete", "token_refresh",
                         f"Token refreshed for {account_id} account",
@@ -463,7 +460,7 @@ class StatementWorkflow:
                 
                 # Search for emails from this sender in date range that contain "statement"
                 query = f"from:{sender_email} statement"
-                emails = email_client.search_emails_by_date_range(start_date, end_date, query)
+                emails = await email_client.search_emails_by_date_range_async(start_date, end_date, query)
                 
                 if not emails:
                     logger.info(f"No emails found from {sender_email} in {account_id} account", extra=self._log_extra())
@@ -477,10 +474,15 @@ class StatementWorkflow:
                     data={"sender": sender_email, "email_count": len(emails)},
                 )
                 
+                # Fetch every matching email in batched requests up front
+                email_contents = await email_client.get_email_contents_async(
+                    [email_data["id"] for email_data in emails if email_data.get("id")]
+                )
+                
                 for email_data in emails:
                     try:
                         email_id = email_data.get("id")
-                        email_details = email_client.get_email_content(email_id)
+                        email_details = email_contents.get(email_id)
                         
                         if not email_details:
                             continue
@@ -527,17 +529,15 @@ class StatementWorkflow:
                                     data={"filename": original_filename, "subject": subject},
                                 )
 
-                                # Download attachment data
-                                attachment_data = email_client.download_attachment(email_id, attachment_id)
-                                if not attachment_data:
-                                    continue
-
-                                # Save to temp directory
+                                # Stream the attachment straight into the temp directory
                                 temp_file_path = self.temp_dir / normalized_filename
-                                with open(temp_file_path, "wb") as f:
-                                    f.write(attachment_data)
+                                file_size = await email_client.download_attachment_to_file_async(
+                                    email_id, attachment_id, temp_file_path, attachment.get("inline_data")
+                                )
+                                if not file_size:
+                                    temp_file_path.unlink(missing_ok=True)
+                                    continue
                                 
-                                file_size = temp_file_path.stat().st_size
                                 logger.info(f"Downloaded from {account_id}: {normalized_filename}", extra=self._log_extra())
                                 self._emit(
                                     "pdf_downloaded", "pdf_download",
@@ -687,11 +687,17 @@ class StatementWorkflow:
                 "error": str(e)
             }
 
+    async def _get_account_nickname(self, sender_email: str) -> Optional[str]:
+        """Account nickname for a statement sender, looked up once per workflow run."""
+        if sender_email not in self._account_nicknames:
+            self._account_nicknames[sender_email] = await AccountOperations.get_account_nickname_by_sender(sender_email)
+        return self._account_nicknames[sender_email]
+
     async def _generate_normalized_filename(self, sender_email: str, email_date: str, original_filename: str) -> str:
         """Generate normalized filename for the statement"""
         try:
             # Get account nickname
-            account_nickname = await AccountOperations.get_account_nickname_by_sender(sender_email)
+            account_nickname = await self._get_account_nickname(sender_email)
             
             if not account_nickname:
                 # Fallback to sender email
@@ -770,7 +776,7 @@ class StatementWorkflow:
             log_key = statement_data.get("log_key") or normalized_filename.replace("_locked.pdf", "")
             
             # Unlock the PDF first
-            account_nickname = await AccountOperations.get_account_nickname_by_sender(sender_email)
+            account_nickname = await self._get_account_nickname(sender_email)
             unlock_result = await self._unlock_pdf_async(temp_file_path, sender_email, account_nickname=account_nickname)
             if not unlock_result.get("success"):
                 logger.warning(f"Could not unlock PDF for upload: {normalized_filename}", extra=self._log_extra())
@@ -1103,7 +1109,7 @@ class StatementWorkflow:
 
                                 # Skip sender entirely if all their statements are already db_inserted
                                 if not override:
-                                    account_nickname_for_check = await AccountOperations.get_account_nickname_by_sender(sender_email)
+                                    account_nickname_for_check = await self._get_account_nickname(sender_email)
                                     sender_done = await StatementLogOperations.check_sender_fully_complete(
                                         sender_email, expected_statement_month
                                     )
@@ -1728,7 +1734,7 @@ class StatementWorkflow:
             
             
             # Get account nickname to determine expected CSV filename pattern
-            account_nickname = await AccountOperations.get_account_nickname_by_sender(sender_email)
+            account_nickname = await self._get_account_nickname(sender_email)
             if not account_nickname:
                 logger.warning(f"No account nickname found for sender: {sender_email}", extra=self._log_extra())
                 return False
@@ -47,6 +47,9 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET_2: str | None = None
     GOOGLE_REFRESH_TOKEN_2: str | None = None
     GOOGLE_CLIENT_SECRET_FILE_2: str | None = None
+    # Gmail access tokens are persisted here (one owner-only file per account)
+    # so a new process can reuse a still-valid token
+    GMAIL_TOKEN_CACHE_DIR: str = "~/.cache/marty"
 
     # Google Cloud Storage
     GOOGLE_CLOUD_PROJECT_ID: str | None = None
@@ -73,6 +76,9 @@ class Settings(BaseSettings):
 
     # Email ingestion scheduler
     EMAIL_INGESTION_INTERVAL_HOURS: int = 4
+    # SQLite cache of emails already run through the LLM parser; relative paths
+    # are resolved against backend/
+    PROCESSED_EMAILS_DB_PATH: str = "data/email_ingestion/processed_emails.db"
 
     # Statement search window: emails are fetched from the Nth of the previous
     # month to the Nth of the current month. Set to a day that's safely after
@@ -0,0 +1,951 @@
+"""Unit tests for EmailClient helpers that don't need a live Gmail connection."""
+import asyncio
+import base64
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.services.database_manager.operations import AccountOperations
+from src.services.email_ingestion import client as client_module
+from src.services.email_ingestion import token_manager as token_manager_module
+from src.services.email_ingestion.client import EmailClient
+
+
+@pytest.fixture(autouse=True)
+def fresh_content_cache(monkeypatch):
+    """Parsed messages are cached module-wide; start every test with an empty cache."""
+    monkeypatch.setattr(client_module, "_CONTENT_CACHE", OrderedDict())
+
+
+def make_client(account_id="primary"):
+    """Build an EmailClient without running __init__ (no settings / network)."""
+    client = EmailClient.__new__(EmailClient)
+    client.account_id = account_id
+    client._creds_valid_until = 0.0
+    client._credentials_lock = threading.RLock()
+    client._local = threading.local()
+    client._search_cache = OrderedDict()
+    client._search_cache_lock = threading.Lock()
+    return client
+
+
+def test_refresh_credentials_short_circuits_while_token_is_fresh():
+    client = make_client()
+    client.token_manager = MagicMock(refresh_threshold=300)
+    creds = MagicMock(expiry=datetime.utcnow() + timedelta(hours=1))
+    client._mark_credentials_fresh(creds)
+
+    assert client._refresh_credentials() is True
+    client.token_manager.get_valid_credentials.assert_not_called()
+    client.token_manager._is_token_expired.assert_not_called()
+
+
+def test_mark_credentials_fresh_without_expiry_forces_recheck():
+    client = make_client()
+    client.token_manager = MagicMock(refresh_threshold=300)
+    client._creds_valid_until = time.monotonic() + 1000
+    client._mark_credentials_fresh(MagicMock(expiry=None))
+    assert client._creds_valid_until == 0.0
+
+
+def test_refresh_credentials_swaps_token_on_the_existing_connection(monkeypatch):
+    client = make_client()
+    client.token_manager = MagicMock(refresh_threshold=300)
+    client.creds = MagicMock(token="tok-1", expiry=None)
+    client._http = MagicMock()
+    client.service = service = object()
+    monkeypatch.setattr(client_module.EmailClient, "_credentials_cache", {})
+    build = MagicMock()
+    monkeypatch.setattr(client_module, "build", build)
+    new_creds = MagicMock(token="tok-2", expiry=None)
+    client.token_manager.get_valid_credentials.return_value = new_creds
+
+    assert client._refresh_credentials() is True
+    assert client.creds is new_creds and client._http.credentials is new_creds
+    assert client.service is service
+    build.assert_not_called()
+
+
+def test_execute_reuses_thread_connection_across_token_refresh(monkeypatch):
+    monkeypatch.setattr(client_module, "AuthorizedHttp", MagicMock(side_effect=lambda creds, http: MagicMock(credentials=creds)))
+    client = make_client()
+    client.creds = MagicMock(token="tok-1")
+    request = MagicMock()
+
+    client._execute(request)
+    first_http = request.execute.call_args.kwargs["http"]
+    client.creds = MagicMock(token="tok-2")
+    client._execute(request)
+
+    assert request.execute.call_args.kwargs["http"] is first_http
+    assert first_http.credentials is client.creds
+    assert client_module.AuthorizedHttp.call_count == 1
+
+
+INSTAMART_HTML = """
+<html><body>
+<p>Your Swiggy Instamart order has been delivered</p>
+<table>
+  <tr><td>2 x Amul Taaza Milk</td><td>&#8377;56</td></tr>
+  <tr><td>1 x Brown Bread</td><td>&#8377;45</td></tr>
+</table>
+<table>
+  <tr><td>Item Bill</td><td>&#8377;101</td></tr>
+  <tr><td>1 x Not An Item</td><td>&#8377;0</td></tr>
+  <tr><td>Grand Total</td><td>&#8377;120</td></tr>
+</table>
+</body></html>
+"""
+
+
+def test_parse_instamart_items_skips_summary_tables():
+    info = make_client()._parse_swiggy_order_info(INSTAMART_HTML)
+    assert info["order_type"] == "Instamart"
+    assert info["items"] == [
+        {"name": "Amul Taaza Milk", "quantity": 2},
+        {"name": "Brown Bread", "quantity": 1},
+    ]
+    assert info["amount"] == "120"
+
+
+FOOD_DELIVERY_HTML = """
+<html><body>
+<p>Your Swiggy order was delivered</p>
+<p>Order delivered at Saturday, March 8, 2025 8:15 PM</p>
+<table>
+  <tr><th>Item Name</th><th>Quantity</th><th>Price</th></tr>
+  <tr><td>Cold Coffee</td><td>2</td><td>&#8377;240</td></tr>
+  <tr><td>Paneer Tikka</td><td>1</td><td>&#8377;280</td></tr>
+  <tr><td>Item Total</td><td></td><td>&#8377;520</td></tr>
+  <tr><td>Platform Fee</td><td></td><td>&#8377;5</td></tr>
+  <tr><td>GST and Restaurant Charges</td><td></td><td>&#8377;26</td></tr>
+</table>
+<div><p>Delivery To:</p><h5>Home</h5><h5>12, 5th Cross</h5><h5>Indiranagar, Bengaluru</h5></div>
+</body></html>
+"""
+
+
+def test_parse_food_delivery_items_filters_cost_rows():
+    info = make_client()._parse_swiggy_order_info(FOOD_DELIVERY_HTML)
+    assert info["items"] == [
+        {"name": "Cold Coffee", "quantity": 2},
+        {"name": "Paneer Tikka", "quantity": 1},
+    ]
+    assert info["order_date"] == "March 8, 2025"
+    assert info["order_time"] == "8:15 PM"
+    assert info["delivery_address"] == "12, 5th Cross, Indiranagar, Bengaluru"
+
+
+UBER_HTML = """
+<html><body>
+<p>Thanks for riding, Chaitanya</p>
+<table>
+  <tr><td>Total</td><td data-testid="total_fare_amount">&#8377;245.50</td></tr>
+  <tr><td>Base Fare</td><td>&#8377;180.00</td></tr>
+  <tr><td>Booking Fee</td><td>&#8377;15.50</td></tr>
+</table>
+<p>Uber Go</p>
+<p>8.4 kilometres | 23 min</p>
+</body></html>
+"""
+
+
+def test_parse_uber_trip_info_extracts_fare_breakdown():
+    info = make_client()._parse_uber_trip_info(UBER_HTML)
+    assert info["amount"] == "245.50"
+    assert info["vehicle_type"] == "Uber Go"
+    assert info["distance"] == "8.4 kilometres"
+    assert info["duration"] == "23 min"
+    assert [i["name"] for i in info["items"]] == [
+        "Base Fare (₹180.00)",
+        "Booking Fee (₹15.50)",
+    ]
+
+
+@pytest.mark.skipif(not client_module.HAS_LXML, reason="lxml not installed")
+def test_parse_uber_trip_info_handles_unclosed_cells_with_lxml():
+    html = "<p>Total ₹212.00</p><table><tr><td>Base Fare<td>₹60.00</tr><tr><td>Distance<td>₹120</tr></table>"
+    info = make_client()._parse_uber_trip_info(html)
+    assert [item["name"] for item in info["items"]] == ["Base Fare (₹60.00)", "Distance (₹120)"]
+
+
+def test_parse_message_reuses_decoded_html_for_uber_trip_info():
+    client = make_client()
+    client._extract_html_content = MagicMock(side_effect=AssertionError("payload walked twice"))
+    html = base64.urlsafe_b64encode(UBER_HTML.encode()).decode()
+    message = {"payload": {
+        "headers": [{"name": "Subject", "value": "Your Tuesday trip with Uber"}],
+        "parts": [{"mimeType": "text/html", "body": {"data": html}}],
+    }}
+    content = client._parse_message("m1", message)
+    assert content["uber_trip_info"]["amount"] == "245.50"
+
+
+def test_parse_uber_vehicle_type_follows_pattern_priority_not_text_order():
+    html = "<p>Auto-debit enabled on your card</p><p>Uber Premier</p><p>Total ₹540.00</p>"
+    assert make_client()._parse_uber_trip_info(html)["vehicle_type"] == "Uber Premier"
+
+
+def test_extract_attachments_walks_nested_parts_in_order():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {
+                "mimeType": "multipart/alternative",
+                "parts": [
+                    {"mimeType": "text/plain", "body": {"data": "aGk="}},
+                    {"mimeType": "application/pdf", "filename": "a.pdf",
+                     "body": {"attachmentId": "att-a", "size": 10}},
+                ],
+            },
+            {"mimeType": "application/pdf", "filename": "b.pdf",
+             "body": {"attachmentId": "att-b", "size": 20}},
+        ],
+    }
+    attachments = make_client()._extract_attachments(payload)
+    assert [a["attachment_id"] for a in attachments] == ["att-a", "att-b"]
+    assert attachments[1] == {
+        "filename": "b.pdf", "mime_type": "application/pdf", "size": 20, "attachment_id": "att-b",
+    }
+
+
+def test_extract_html_content_returns_first_html_part_depth_first():
+    def encode(text):
+        return base64.urlsafe_b64encode(text.encode()).decode()
+
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {"mimeType": "text/plain", "body": {"data": encode("<html>not html</html>")}},
+            {
+                "mimeType": "multipart/alternative",
+                "parts": [
+                    {"mimeType": "text/html", "body": {}},
+                    {"mimeType": "multipart/related", "parts": [
+                        {"mimeType": "text/html", "body": {"data": encode("<p>nested</p>")}},
+                    ]},
+                ],
+            },
+            {"mimeType": "text/html", "body": {"data": encode("<p>outer</p>")}},
+        ],
+    }
+    assert make_client()._extract_html_content(payload) == "<p>nested</p>"
+
+
+def test_detect_merchant_info_matches_subject_and_order_id():
+    client = make_client()
+    info = client._detect_merchant_info("Your Instamart Order #ABC-123 is delivered", "noreply@swiggy.in", "")
+    assert info == {"merchant_name": "Swiggy", "merchant_type": "food_delivery", "order_id": "ABC-123"}
+    # Sender alone must not trigger a match
+    assert client._detect_merchant_info("Payment receipt", "noreply@swiggy.in", "") is None
+
+
+def test_parse_swiggy_order_info_skips_non_swiggy_html():
+    assert make_client()._parse_swiggy_order_info("<html><body>Zomato order</body></html>") is None
+
+
+DINEOUT_HTML = """
+<html><body>
+<p>Swiggy Dineout</p>
+<p>Paid to: Toit Brewpub, 298 100 Feet Road, Indiranagar, Bengaluru Here are the details</p>
+<table>
+  <tr><td>Bill Details</td><td></td></tr>
+  <tr><td>Bill Amount</td><td>&#8377;2,400</td></tr>
+  <tr><td>Total Paid</td><td>&#8377;2,100</td></tr>
+</table>
+</body></html>
+"""
+
+
+def test_parse_dineout_total_and_paid_to_address():
+    info = make_client()._parse_swiggy_order_info(DINEOUT_HTML)
+    assert info["order_type"] == "Dineout"
+    assert info["amount"] == "2100"
+    assert info["restaurant_name"] == "Toit Brewpub"
+    assert info["delivery_address"] == "298 100 Feet Road, Indiranagar, Bengaluru"
+
+
+def test_search_emails_by_date_range_reuses_cached_listing():
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client.service = MagicMock()
+    client._execute = lambda request: request.execute()
+    client.service.users().messages().list().execute.return_value = {"messages": [{"id": "m1"}]}
+
+    first = client.search_emails_by_date_range("2025/01/01", "2025/01/31", "from:a@b.com", use_cache=True)
+    second = client.search_emails_by_date_range("2025/01/01", "2025/01/31", "from:a@b.com", use_cache=True)
+
+    assert first == second == [{"id": "m1"}]
+    assert client.service.users().messages().list().execute.call_count == 1
+
+    client.invalidate_search_cache()
+    client.search_emails_by_date_range("2025/01/01", "2025/01/31", "from:a@b.com", use_cache=True)
+    assert client.service.users().messages().list().execute.call_count == 2
+
+
+def test_search_cache_drops_least_recently_used_listing_when_full(monkeypatch):
+    monkeypatch.setattr(client_module, "_SEARCH_CACHE_SIZE", 2)
+    client = paged_list_client([[{"id": "m1"}]])
+    client.service.users().messages().list.return_value.execute.side_effect = None
+    client.service.users().messages().list.return_value.execute.return_value = {"messages": [{"id": "m1"}]}
+    for sender in ("a", "b", "a", "c"):
+        client.search_emails_by_date_range("2025/01/01", "2025/01/31", f"from:{sender}", use_cache=True)
+
+    # The hit on "a" made "b" the least recently used listing
+    assert [key[2] for key in client._search_cache] == ["from:a", "from:c"]
+
+
+def test_get_email_contents_fetches_in_parallel_and_drops_failures():
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client.service = MagicMock()
+    client._execute = lambda request: request
+    messages = {
+        "m1": {"payload": {"headers": [{"name": "Subject", "value": "Alert 1"}]}},
+        "m2": {"payload": {"headers": [{"name": "Subject", "value": "Alert 2"}]}},
+    }
+
+    def get(userId, id, format):
+        if id not in messages:
+            raise RuntimeError("boom")
+        return messages[id]
+
+    client.service.users().messages().get.side_effect = get
+
+    contents = client.get_email_contents(["m1", "missing", "m2"], max_workers=3)
+
+    assert list(contents) == ["m1", "m2"]
+    assert contents["m2"]["subject"] == "Alert 2"
+    client._refresh_credentials.assert_called_once()
+
+
+def test_generate_normalized_filename_reuses_background_loop(monkeypatch):
+    loops = []
+
+    async def fake_nicknames(sender_emails):
+        loops.append(asyncio.get_running_loop())
+        return {sender: "Axis Atlas" for sender in sender_emails}
+
+    monkeypatch.setattr(AccountOperations, "get_account_nicknames_by_senders", staticmethod(fake_nicknames))
+    monkeypatch.setattr(client_module, "_NICKNAME_CACHE", {})
+    client = make_client()
+    date = "Tue, 04 Mar 2025 10:15:00 +0530 (IST)"
+
+    assert client._generate_normalized_filename("cc@axis.com", date, "pdf") == "axis_atlas_20250304.pdf"
+    assert client._generate_normalized_filename("dc@axis.com", date, "pdf") == "axis_atlas_20250304.pdf"
+    assert len(loops) == 2 and loops[0] is loops[1]
+
+
+def test_account_nickname_lookup_is_cached_per_sender(monkeypatch):
+    lookup = MagicMock(side_effect=[{"cc@hdfc.com": "HDFC Regalia"}, {}, {"cc@amex.com": "Amex Plat"}])
+
+    async def fake_nicknames(sender_emails):
+        return lookup(sender_emails)
+
+    monkeypatch.setattr(AccountOperations, "get_account_nicknames_by_senders", staticmethod(fake_nicknames))
+    monkeypatch.setattr(client_module, "_NICKNAME_CACHE", {})
+
+    assert client_module._lookup_account_nickname("cc@hdfc.com") == "HDFC Regalia"
+    assert client_module._lookup_account_nickname("cc@hdfc.com") == "HDFC Regalia"
+    # Misses are not cached, so a newly added account is found on retry
+    assert client_module._lookup_account_nickname("cc@amex.com") is None
+    assert client_module._lookup_account_nickname("cc@amex.com") == "Amex Plat"
+    assert lookup.call_count == 3
+
+
+def test_email_date_stamp_strips_zone_name_and_rejects_garbage():
+    assert client_module._email_date_stamp("Tue, 04 Mar 2025 23:50:00 +0530 (IST)") == "20250304"
+    assert client_module._email_date_stamp("Tue, 04 Mar 2025 23:50:00 +0530") == "20250304"
+    assert client_module._email_date_stamp("yesterday") is None
+
+
+def test_fast_rfc2822_stamp_matches_strptime_and_rejects_bad_dates():
+    fast = client_module._fast_rfc2822_stamp
+    assert fast("Tue, 4 Mar 2025 09:00:00 +0530") == "20250304"
+    assert fast("04 Mar 2025 09:00:00 +0000") == "20250304"
+    assert fast("Sat, 29 Feb 2025 09:00:00 +0000") is None
+    assert fast("Tue, 04 Mxx 2025 09:00:00 +0000") is None
+    # Not RFC 2822 at all: _email_date_stamp falls back to parsedate_to_datetime, which also fails
+    assert client_module._email_date_stamp("2025-03-04") is None
+    assert client_module._email_date_stamp(None) is None
+    assert client_module._email_date_stamp("Unknown date") is None
+    assert client_module._email_date_stamp("Tue, ²4 Mar 0000 10:15:00 +0530") is None
+    assert client_module._email_date_stamp("Tue, 04 Mar 0000 10:15:00 +0530") is None
+
+    # Obsolete RFC 2822 shapes the fast path skips are still stamped
+    assert client_module._email_date_stamp("4 Mar 25 10:15 GMT") == "20250304"
+    assert client_module._email_date_stamp("Tue,4 Mar 2025 10:15:00 +0000") == "20250304"
+
+
+def test_save_attachment_writes_bytes_and_truncates_existing(tmp_path):
+    client = make_client()
+    target = tmp_path / "statements"
+    data = b"%PDF-1.7" + b"x" * 100_000
+
+    saved = client._save_attachment_with_normalized_name("axis_20250304.pdf", b"old contents that are longer" * 10000, str(target))
+    saved = client._save_attachment_with_normalized_name("axis_20250304.pdf", data, str(target))
+
+    assert saved == str(target / "axis_20250304.pdf")
+    assert (target / "axis_20250304.pdf").read_bytes() == data
+
+
+def test_save_attachment_accepts_reused_buffers(tmp_path):
+    client = make_client()
+    buf = bytearray(b"HEADER%PDF-body")
+
+    saved = client._save_attachment_with_normalized_name("slice.pdf", memoryview(buf)[6:], str(tmp_path))
+
+    assert saved == str(tmp_path / "slice.pdf")
+    assert (tmp_path / "slice.pdf").read_bytes() == b"%PDF-body"
+
+
+def test_b64url_decode_chunks_streams_into_file(tmp_path):
+    payload = bytes(range(256)) * 50
+    encoded = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    chunks = list(client_module._b64url_decode_chunks(encoded, chunk_size=1024))
+    assert len(chunks) > 1 and b"".join(chunks) == payload
+
+    saved = make_client()._save_attachment_with_normalized_name(
+        "streamed.pdf", client_module._b64url_decode_chunks(encoded, chunk_size=1024), str(tmp_path)
+    )
+    assert (tmp_path / "streamed.pdf").read_bytes() == payload
+    assert saved == str(tmp_path / "streamed.pdf")
+
+
+def test_save_attachment_recreates_directory_removed_after_first_save(tmp_path):
+    client = make_client()
+    target = tmp_path / "locked"
+
+    client._save_attachment_with_normalized_name("a.pdf", b"a", str(target))
+    (target / "a.pdf").unlink()
+    target.rmdir()
+
+    assert client._save_attachment_with_normalized_name("b.pdf", b"b", str(target)) == str(target / "b.pdf")
+    assert (target / "b.pdf").read_bytes() == b"b"
+
+
+def test_write_file_concurrent_writers_of_one_path_all_succeed(tmp_path):
+    path = tmp_path / "axis_20250304.pdf"
+    payloads = [bytes([i]) * 200_000 for i in range(8)]
+    start = threading.Barrier(len(payloads))
+    errors = []
+
+    def write(payload):
+        start.wait()
+        try:
+            for _ in range(5):
+                client_module._write_file(path, (payload[i:i + 4096] for i in range(0, len(payload), 4096)))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(payload,)) for payload in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert path.read_bytes() in payloads
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+
+def test_save_attachment_does_not_replay_consumed_chunks(tmp_path, monkeypatch):
+    real_replace = client_module.os.replace
+    calls = []
+
+    def replace_once_missing(src, dst):
+        # The rename fails once, after every chunk has been written
+        calls.append(src)
+        if len(calls) == 1:
+            raise FileNotFoundError(dst)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(client_module.os, "replace", replace_once_missing)
+    chunks = iter([b"%PDF", b"-1.7"])
+
+    assert make_client()._save_attachment_with_normalized_name("a.pdf", chunks, str(tmp_path)) is None
+    assert len(calls) == 1
+    assert not (tmp_path / "a.pdf").exists()
+
+
+def test_format_normalized_filename_nickname_and_domain_fallback():
+    client = make_client()
+    date = "Tue, 04 Mar 2025 10:15:00 +0530"
+    assert client._format_normalized_filename("x@y.com", "SBI Cashback Card", date, "pdf") == "sbi_cashback_card_20250304.pdf"
+    assert client._format_normalized_filename("Statements@HDFCBank.net", None, date, "pdf") == "hdfcbank_20250304.pdf"
+
+
+def test_generate_normalized_filenames_resolves_senders_in_one_query(monkeypatch):
+    lookup = MagicMock(return_value={"cc@axis.com": "Axis Atlas", "cc@sbi.co.in": None})
+
+    async def fake_nicknames(sender_emails):
+        return lookup(sender_emails)
+
+    monkeypatch.setattr(AccountOperations, "get_account_nicknames_by_senders", staticmethod(fake_nicknames))
+    monkeypatch.setattr(client_module, "_NICKNAME_CACHE", {})
+
+    names = make_client()._generate_normalized_filenames([
+        ("cc@axis.com", "Tue, 04 Mar 2025 10:15:00 +0530", "pdf"),
+        ("cc@sbi.co.in", "Wed, 05 Mar 2025 10:15:00 +0530", "pdf"),
+        ("cc@axis.com", "Thu, 03 Apr 2025 10:15:00 +0530", "pdf"),
+    ])
+
+    assert names == ["axis_atlas_20250304.pdf", "sbi_20250305.pdf", "axis_atlas_20250403.pdf"]
+    lookup.assert_called_once_with(["cc@axis.com", "cc@sbi.co.in"])
+
+
+def test_run_coroutine_sync_refuses_reentry_from_background_loop():
+    async def inner():
+        return "ok"
+
+    async def reenter():
+        return client_module._run_coroutine_sync(inner())
+
+    with pytest.raises(RuntimeError):
+        client_module._run_coroutine_sync(reenter())
+
+    async def from_other_loop():
+        return client_module._run_coroutine_sync(inner())
+
+    assert asyncio.run(from_other_loop()) == "ok"
+
+
+def test_download_latest_attachment_without_persist_returns_bytes(tmp_path):
+    client = make_client()
+    client.search_emails_by_date_range = MagicMock(return_value=[{"id": "m1"}])
+    client.get_email_content = MagicMock(return_value={
+        "subject": "Statement", "date": "Tue, 04 Mar 2025 10:15:00 +0530",
+        "attachments": [{"filename": "stmt.PDF", "attachment_id": "a1"}],
+    })
+    client.download_attachment = MagicMock(return_value=b"%PDF-1.4")
+    client._generate_normalized_filename = MagicMock(return_value="axis_20250304.pdf")
+
+    result = client.download_latest_attachment_with_normalized_name("cc@axis.com", download_dir=str(tmp_path), persist=False)
+
+    assert client.search_emails_by_date_range.call_args.kwargs["query"] == "from:cc@axis.com has:attachment filename:pdf"
+    assert client.search_emails_by_date_range.call_args.kwargs["max_results"] == 1
+    assert result["success"] is True
+    assert result["saved_path"] is None
+    assert result["attachment_data"] == b"%PDF-1.4"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_latest_attachments_bulk_keeps_order_and_saves_every_file(tmp_path):
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client.search_emails_by_date_range = lambda start_date, end_date, query, use_cache, max_results: [{"id": query[5:8]}]
+    client.get_email_content = lambda message_id: {
+        "subject": "Statement", "date": "Tue, 04 Mar 2025 10:15:00 +0530",
+        "attachments": [{"filename": "stmt.pdf", "attachment_id": message_id}],
+    }
+    client._generate_normalized_filename = lambda sender, date, file_type: f"{sender[:3]}_20250304.pdf"
+    client.download_attachment_chunks = lambda message_id, attachment_id, inline_data=None: iter([b"%PDF-" + message_id.encode()])
+    senders = [f"{i:03d}@bank.com" for i in range(6)]
+
+    results = asyncio.run(client.download_latest_attachments_bulk_async(senders, download_dir=str(tmp_path), max_workers=3))
+
+    assert [r["normalized_filename"] for r in results] == [f"{i:03d}_20250304.pdf" for i in range(6)]
+    assert all((tmp_path / f"{i:03d}_20250304.pdf").read_bytes() == f"%PDF-{i:03d}".encode() for i in range(6))
+
+
+def test_write_file_leaves_no_partial_file_when_stream_fails(tmp_path):
+    target = tmp_path / "hdfc_20250304.pdf"
+    target.write_bytes(b"previous statement")
+
+    def broken_stream():
+        yield b"%PDF-partial"
+        raise ValueError("bad base64")
+
+    with pytest.raises(ValueError):
+        client_module._write_file(target, broken_stream())
+
+    assert target.read_bytes() == b"previous statement"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["hdfc_20250304.pdf"]
+
+
+ALERT_HTML = """
+<html><head><style>p { color: red; }</style><script>track()</script></head>
+<body>
+<p style="font-size: 12px">Dear Customer,</p>
+<p>Rs. 450.00 has been debited from account **1234</p>
+<div>@media screen { .x { display: none } }</div>
+<p>Team Bank</p>
+</body></html>
+"""
+
+
+def test_html_to_text_drops_styles_scripts_and_css_rules():
+    text = make_client()._html_to_text(ALERT_HTML)
+    # The @media rule's line is emptied rather than removed
+    assert text == "Dear Customer,\nRs. 450.00 has been debited from account **1234\n\nTeam Bank"
+
+
+def test_html_to_text_lxml_matches_beautifulsoup(monkeypatch):
+    samples = [
+        ALERT_HTML, UBER_HTML, INSTAMART_HTML, FOOD_DELIVERY_HTML, DINEOUT_HTML,
+        "<body>Hi<script>track()</script> there<!-- note -->, Rs 5 &amp; more</body>",
+    ]
+    with_lxml = [make_client()._html_to_text(html) for html in samples]
+    monkeypatch.setattr(client_module, "HAS_LXML", False)
+    assert [make_client()._html_to_text(html) for html in samples] == with_lxml
+    assert with_lxml[-1] == "Hi\nthere\n, Rs 5 & more"
+
+
+def test_html_to_text_regex_fallback(monkeypatch):
+    monkeypatch.setattr(client_module, "HAS_BS4", False)
+    monkeypatch.setattr(client_module, "HAS_LXML", False)
+    text = make_client()._html_to_text(ALERT_HTML)
+    assert text == "Dear Customer,\nRs. 450.00 has been debited from account **1234\n\nTeam Bank"
+
+
+def test_html_to_text_regex_fallback_decodes_entities(monkeypatch):
+    monkeypatch.setattr(client_module, "HAS_BS4", False)
+    monkeypatch.setattr(client_module, "HAS_LXML", False)
+    text = make_client()._html_to_text("<p>Rs&nbsp;5 &amp; &lt;b&gt;more</p>")
+    assert text == "Rs\xa05 & <b>more"
+
+
+class FakeBatch:
+    """Stand-in for googleapiclient's BatchHttpRequest that answers from a dict."""
+
+    def __init__(self, callback, messages, batches):
+        self.callback, self.messages, self.requests = callback, messages, []
+        batches.append(self)
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self, http=None):
+        for request_id in self.requests:
+            if request_id in self.messages:
+                self.callback(request_id, self.messages[request_id], None)
+            else:
+                self.callback(request_id, None, RuntimeError("rate limited"))
+
+
+def test_get_email_contents_batches_and_retries_failed_ids(monkeypatch):
+    monkeypatch.setattr(client_module, "_GMAIL_BATCH_SIZE", 2)
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client._execute = lambda request: request.execute()
+    client.service = MagicMock()
+    batched = {f"m{i}": {"payload": {"headers": [{"name": "Subject", "value": f"Alert {i}"}]}} for i in (1, 2, 4)}
+    batches = []
+    client.service.new_batch_http_request.side_effect = lambda callback: FakeBatch(callback, batched, batches)
+    client._fetch_email_content = MagicMock(return_value={"id": "m3", "subject": "Alert 3"})
+
+    contents = client.get_email_contents(["m1", "m2", "m3", "m4"])
+
+    assert list(contents) == ["m1", "m2", "m3", "m4"]
+    assert contents["m4"]["subject"] == "Alert 4"
+    assert [b.requests for b in batches] == [["m1", "m2"], ["m3", "m4"]]
+    client._fetch_email_content.assert_called_once_with("m3")
+
+
+def test_async_gmail_wrappers_run_off_the_event_loop():
+    client = make_client()
+    caller_threads = []
+
+    def fake_contents(message_ids, max_workers):
+        caller_threads.append(threading.get_ident())
+        return {mid: {"id": mid} for mid in message_ids}
+
+    client.get_email_contents = fake_contents
+
+    contents = asyncio.run(client.get_email_contents_async(["m1"]))
+
+    assert contents == {"m1": {"id": "m1"}}
+    assert caller_threads and caller_threads[0] != threading.get_ident()
+
+
+def test_parse_message_reads_headers_case_insensitively_first_wins():
+    message = {"payload": {"headers": [
+        {"name": "SUBJECT", "value": "Alert"},
+        {"name": "from", "value": "alerts@bank.com"},
+        {"name": "Date", "value": "Tue, 04 Mar 2025 10:15:00 +0530"},
+        {"name": "Subject", "value": "Duplicate"},
+    ]}}
+    content = make_client()._parse_message("m1", message)
+    assert (content["subject"], content["sender"], content["date"]) == (
+        "Alert", "alerts@bank.com", "Tue, 04 Mar 2025 10:15:00 +0530",
+    )
+
+
+def test_list_recent_transaction_emails_fetches_headers_via_metadata_batch():
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client._execute = lambda request: request.execute()
+    client.service = MagicMock()
+    client.service.users().messages().list().execute.return_value = {"messages": [{"id": "m1"}, {"id": "m2"}]}
+    metadata = {"m1": {"payload": {"headers": [
+        {"name": "Subject", "value": "Payment receipt"},
+        {"name": "From", "value": "billing@shop.com"},
+        {"name": "Date", "value": "Tue, 04 Mar 2025 10:15:00 +0530"},
+    ]}}}
+    batches = []
+    client.service.new_batch_http_request.side_effect = lambda callback: FakeBatch(callback, metadata, batches)
+
+    messages = client.list_recent_transaction_emails(include_headers=True)
+
+    assert messages[0]["subject"] == "Payment receipt" and messages[0]["sender"] == "billing@shop.com"
+    assert messages[1]["subject"] == ""
+    client.service.users().messages().get.assert_any_call(
+        userId="me", id="m1", format="metadata", metadataHeaders=["Subject", "From", "Date"],
+        fields="id,snippet,payload/headers",
+    )
+
+
+def test_get_email_contents_serves_repeat_ids_from_content_cache(monkeypatch):
+    monkeypatch.setattr(client_module, "_CONTENT_CACHE_SIZE", 2)
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client._batch_get_messages = MagicMock(side_effect=lambda ids: {mid: {"payload": {}} for mid in ids})
+
+    client.get_email_contents(["m1", "m2", "m3"])
+    client._batch_get_messages.reset_mock()
+    contents = client.get_email_contents(["m2", "m3", "m1"])
+
+    # m1 was evicted by the size bound; m2/m3 came from the cache
+    client._batch_get_messages.assert_called_once_with(["m1"])
+    assert list(contents) == ["m2", "m3", "m1"]
+    assert client.get_email_content("m3")["id"] == "m3"
+    assert client_module._cached_email_content("secondary", "m3") is None
+
+
+def test_content_cache_drops_raw_message_and_isolates_callers():
+    content = {"id": "m1", "attachments": [{"filename": "a.pdf"}], "raw_message": {"payload": {}}}
+    client_module._remember_email_content("primary", "m1", content)
+    content["attachments"].append({"filename": "b.pdf"})
+
+    cached = client_module._cached_email_content("primary", "m1")
+    assert cached == {"id": "m1", "attachments": [{"filename": "a.pdf"}]}
+    cached["attachments"].clear()
+    assert client_module._cached_email_content("primary", "m1")["attachments"] == [{"filename": "a.pdf"}]
+
+
+def test_content_cache_skips_messages_with_inline_attachment_data():
+    attachment = {"filename": "a.pdf", "attachment_id": None, "inline_data": "JVBERi0" * 1000}
+    client_module._remember_email_content("primary", "m1", {"id": "m1", "attachments": [attachment]})
+    client_module._remember_email_content("primary", "m2", {"id": "m2", "attachments": [{"filename": "b.pdf", "attachment_id": "a2"}]})
+
+    assert client_module._cached_email_content("primary", "m1") is None
+    assert client_module._cached_email_content("primary", "m2")["attachments"] == [{"filename": "b.pdf", "attachment_id": "a2"}]
+
+
+def test_b64url_decode_restores_stripped_padding():
+    assert client_module._b64url_decode("aGk") == b"hi"
+    assert client_module._b64url_decode("-_8=") == base64.urlsafe_b64decode("-_8=")
+    assert client_module._b64url_decode_text("aGk_") == base64.urlsafe_b64decode("aGk_").decode("utf-8", errors="ignore")
+
+
+def paged_list_client(pages):
+    """Client whose messages.list() serves `pages` in order, chained by nextPageToken."""
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client.service = MagicMock()
+    client._execute = lambda request: request.execute()
+    responses = [
+        {"messages": page, **({"nextPageToken": f"t{i + 1}"} if i + 1 < len(pages) else {})}
+        for i, page in enumerate(pages)
+    ]
+    client.service.users().messages().list.return_value.execute.side_effect = responses
+    return client
+
+
+def test_search_emails_by_date_range_follows_page_tokens_up_to_max_results():
+    client = paged_list_client([[{"id": "m1"}, {"id": "m2"}], [{"id": "m3"}, {"id": "m4"}], [{"id": "m5"}]])
+
+    messages = client.search_emails_by_date_range("2025/01/01", "2025/01/31", max_results=3)
+
+    assert [m["id"] for m in messages] == ["m1", "m2", "m3"]
+    calls = client.service.users().messages().list.call_args_list
+    assert [c.kwargs.get("pageToken") for c in calls if "q" in c.kwargs] == [None, "t1"]
+
+
+def test_load_client_config_reads_account_settings_and_caches_json(tmp_path):
+    secret_file = tmp_path / "client_secret.json"
+    secret_file.write_text('{"web": {"client_id": "file-id", "client_secret": "file-secret"}}')
+    client = make_client("secondary")
+    client.settings = MagicMock(
+        GOOGLE_CLIENT_SECRET_FILE_2=str(secret_file), GOOGLE_REFRESH_TOKEN_2="refresh-2",
+        GOOGLE_CLIENT_SECRET_FILE=None, GOOGLE_CLIENT_ID="primary-id", GOOGLE_CLIENT_SECRET="primary-secret",
+    )
+    client_module._read_client_secret_file.cache_clear()
+
+    assert client._load_client_config() == {"client_id": "file-id", "client_secret": "file-secret"}
+    assert client._load_client_config() == {"client_id": "file-id", "client_secret": "file-secret"}
+    assert client_module._read_client_secret_file.cache_info().hits == 1
+
+    client.client_config = {"client_id": "file-id", "client_secret": "file-secret"}
+    assert client._get_credentials().refresh_token == "refresh-2"
+    assert make_client("other")._account_settings() == EmailClient._ACCOUNT_SETTINGS["primary"]
+
+
+def test_gmail_service_reuses_the_parsed_discovery_document():
+    first = client_module._build_gmail_service(MagicMock())
+    second = client_module._build_gmail_service(MagicMock())
+
+    assert first._rootDesc is second._rootDesc
+    assert client_module._gmail_discovery_document.cache_info().misses <= 1
+    assert hasattr(first.users().messages(), "list")
+
+
+@pytest.mark.skipif(not client_module.HAS_ORJSON, reason="orjson not installed")
+def test_gmail_service_parses_responses_with_orjson():
+    service = client_module._build_gmail_service(MagicMock())
+    model = service.users().messages()._model
+
+    assert isinstance(model, client_module._OrjsonModel)
+    assert model.deserialize(b'{"id": "m1", "labelIds": ["INBOX"]}') == {"id": "m1", "labelIds": ["INBOX"]}
+    assert model.deserialize(b"not json") == "not json"
+
+
+def test_refresh_credentials_refreshes_once_for_concurrent_callers(monkeypatch):
+    client = make_client()
+    client.token_manager = MagicMock(refresh_threshold=300)
+    client.creds = MagicMock(token="tok-1", expiry=None)
+    client._http = MagicMock()
+    monkeypatch.setattr(client_module.EmailClient, "_credentials_cache", {})
+    new_creds = MagicMock(token="tok-2", expiry=datetime.utcnow() + timedelta(hours=1))
+
+    def slow_refresh():
+        time.sleep(0.05)
+        return new_creds
+
+    client.token_manager.get_valid_credentials.side_effect = slow_refresh
+    threads = [threading.Thread(target=client._refresh_credentials) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    client.token_manager.get_valid_credentials.assert_called_once()
+    assert client.creds is new_creds and client._http.credentials is new_creds
+
+
+def test_get_email_client_shares_one_client_per_account(monkeypatch):
+    monkeypatch.setattr(client_module, "EmailClient", lambda account_id: object())
+    client_module.get_email_client.cache_clear()
+    try:
+        assert client_module.get_email_client("primary") is client_module.get_email_client("primary")
+        assert client_module.get_email_client("primary") is not client_module.get_email_client("secondary")
+    finally:
+        client_module.get_email_client.cache_clear()
+
+
+def test_client_config_is_loaded_once_per_account(monkeypatch):
+    monkeypatch.setattr(client_module.EmailClient, "_client_config_cache", {})
+    load = MagicMock(side_effect=[{}, {"client_id": "id", "client_secret": "secret"}])
+    monkeypatch.setattr(client_module.EmailClient, "_load_client_config", load)
+
+    assert make_client()._cached_client_config() == {}
+    assert make_client()._cached_client_config() == {"client_id": "id", "client_secret": "secret"}
+    assert make_client()._cached_client_config() == {"client_id": "id", "client_secret": "secret"}
+    assert load.call_count == 2
+
+
+def test_token_manager_reuses_persisted_access_token(tmp_path, monkeypatch):
+    settings = MagicMock(
+        GOOGLE_REFRESH_TOKEN="refresh-1", GOOGLE_CLIENT_ID="id", GOOGLE_CLIENT_SECRET="secret",
+        GMAIL_TOKEN_CACHE_DIR=str(tmp_path / "cache"),
+    )
+    monkeypatch.setattr(token_manager_module, "get_settings", lambda: settings)
+
+    def fake_refresh(self, request):
+        self.token, self.expiry = "access-1", datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(token_manager_module.Credentials, "refresh", fake_refresh)
+    first = token_manager_module.TokenManager().get_valid_credentials()
+    cache_file = tmp_path / "cache" / "gmail_primary.json"
+    assert first.token == "access-1"
+    assert cache_file.stat().st_mode & 0o777 == 0o600
+    assert "refresh-1" not in cache_file.read_text()
+
+    refresh = MagicMock()
+    monkeypatch.setattr(token_manager_module.Credentials, "refresh", refresh)
+    second = token_manager_module.TokenManager().get_valid_credentials()
+    assert second.token == "access-1" and second.expiry == first.expiry
+    refresh.assert_not_called()
+
+    settings.GOOGLE_REFRESH_TOKEN = "refresh-2"
+    token_manager_module.TokenManager().get_valid_credentials()
+    refresh.assert_called_once()
+
+
+def test_token_manager_treats_token_less_credentials_as_unexpired(monkeypatch):
+    settings = MagicMock(GOOGLE_REFRESH_TOKEN="refresh-1", GOOGLE_CLIENT_ID="id", GOOGLE_CLIENT_SECRET="secret")
+    monkeypatch.setattr(token_manager_module, "get_settings", lambda: settings)
+    manager = token_manager_module.TokenManager()
+    # Only get_valid_credentials forces a refresh for these; other callers see them as usable
+    assert manager._is_token_expired(manager._create_credentials()) is False
+
+
+def test_format_amount_keeps_every_significant_digit():
+    assert client_module._format_amount(1500.0) == "1500"
+    assert client_module._format_amount(249.5) == "249.5"
+    assert client_module._format_amount(123456.78) == "123456.78"
+
+
+def test_inline_attachment_data_is_saved_without_attachments_get(tmp_path):
+    client = make_client()
+    client.service = MagicMock()
+    payload = {"parts": [
+        {"mimeType": "text/plain", "body": {"data": "aGk"}},
+        {"filename": "small.pdf", "mimeType": "application/pdf", "body": {"size": 8, "data": "JVBERi0xLjQ"}},
+        {"filename": "big.pdf", "mimeType": "application/pdf", "body": {"size": 9000000, "attachmentId": "att-1"}},
+    ]}
+
+    small, big = client._extract_attachments(payload)
+
+    assert small["attachment_id"] is None and small["inline_data"] == "JVBERi0xLjQ"
+    assert big["attachment_id"] == "att-1" and "inline_data" not in big
+    written = client.download_attachment_to_file("m1", None, tmp_path / "small.pdf", small["inline_data"])
+    assert written == 8 and (tmp_path / "small.pdf").read_bytes() == b"%PDF-1.4"
+    client.service.users().messages().attachments().get.assert_not_called()
+
+
+def test_download_attachment_to_file_streams_decoded_chunks(tmp_path):
+    payload = bytes(range(256)) * 4
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client.service = MagicMock()
+    client._execute = lambda request: request.execute()
+    client.service.users().messages().attachments().get().execute.return_value = {
+        "data": base64.urlsafe_b64encode(payload).decode(),
+    }
+    target = tmp_path / "statement.pdf"
+
+    written = asyncio.run(client.download_attachment_to_file_async("m1", "att-1", target))
+
+    assert written == len(payload)
+    assert target.read_bytes() == payload
+
+
+def test_search_emails_for_transaction_batches_metadata_and_retries_misses():
+    client = make_client()
+    client._refresh_credentials = MagicMock(return_value=True)
+    client._execute = lambda request: request.execute()
+    client.service = MagicMock()
+    client.service.users().messages().list.return_value.execute.return_value = {
+        "messages": [{"id": "m1"}, {"id": "m2"}, {"id": "m3"}],
+    }
+    metadata = {
+        mid: {"snippet": f"snippet {mid}", "payload": {"headers": [{"name": "Subject", "value": f"Receipt {mid}"}]}}
+        for mid in ("m1", "m3")
+    }
+    batches = []
+    client.service.new_batch_http_request.side_effect = lambda callback: FakeBatch(callback, metadata, batches)
+    # m2 fails inside the batch and is fetched on its own
+    client.service.users().messages().get.return_value.execute.return_value = {"snippet": "retried", "payload": {}}
+
+    results = client.search_emails_for_transaction("2025-03-04", -450.0)
+
+    assert [r["id"] for r in results] == ["m1", "m2", "m3"]
+    assert results[1]["snippet"] == "retried"
+    assert results[2] == {"id": "m3", "subject": "Receipt m3", "sender": "", "date": "", "snippet": "snippet m3"}
+    assert [b.requests for b in batches] == [["m1", "m2", "m3"]]
\ No newline at end of file
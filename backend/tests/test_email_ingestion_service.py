@@ -0,0 +1,157 @@
+"""Unit tests for EmailIngestionService with the Gmail client and LLM parser mocked out."""
+import sys
+from types import ModuleType
+from unittest.mock import AsyncMock, MagicMock
+
+try:
+    import src.services.llm_parser.parser  # noqa: F401
+except ImportError:
+    # The LLM parser package isn't part of this checkout; every test replaces it anyway
+    _parser_module = ModuleType("src.services.llm_parser.parser")
+    _parser_module.LLMExpenseParser = MagicMock
+    sys.modules.setdefault("src.services.llm_parser", ModuleType("src.services.llm_parser"))
+    sys.modules.setdefault("src.services.llm_parser.parser", _parser_module)
+
+from src.services.email_ingestion import service as service_module
+from src.services.email_ingestion.service import EmailIngestionService, ProcessedEmailStore
+
+
+def make_service(account_id="primary"):
+    """Build an EmailIngestionService without running __init__ (no Gmail / LLM clients)."""
+    service = EmailIngestionService.__new__(EmailIngestionService)
+    service.account_id = account_id
+    service.email_client = MagicMock()
+    service.llm_parser = MagicMock()
+    service.processed_emails = MagicMock()
+    service.processed_emails.lookup.return_value = {}
+    return service
+
+
+async def test_extract_expenses_keeps_order_and_returns_exceptions():
+    service = make_service()
+    contents = {mid: {"id": mid} for mid in ("m1", "m2", "m3")}
+
+    async def extract(email_content):
+        if email_content["id"] == "m2":
+            raise RuntimeError("LLM unavailable")
+        return {"amount": email_content["id"]}
+
+    service._extract_expense_from_email = extract
+    results = await service._extract_expenses([{"id": "m3"}, {"id": "m2"}, {"id": "m1"}], contents)
+
+    assert results[0] == {"amount": "m3"}
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == {"amount": "m1"}
+
+
+async def test_ingest_counts_failed_and_unfetched_emails_as_errors():
+    service = make_service()
+    service.email_client.list_recent_transaction_emails.return_value = [{"id": "m1"}, {"id": "m2"}, {"id": "m3"}]
+    # m3 failed to fetch, so it is missing from the batched result
+    service.email_client.get_email_contents_async = AsyncMock(return_value={"m1": {"id": "m1"}, "m2": {"id": "m2"}})
+
+    async def extract(email_content):
+        if email_content["id"] == "m2":
+            raise RuntimeError("LLM unavailable")
+        return {"amount": 100, "description": "Coffee"}
+
+    service._extract_expense_from_email = extract
+    result = await service.ingest_recent_transaction_emails()
+
+    assert result["processed"] == 3
+    assert result["extracted"] == 1
+    assert result["errors"] == 2
+    assert result["expenses"] == [{"amount": 100, "description": "Coffee"}]
+
+
+async def test_process_email_attachments_skips_unprocessable_types_and_survives_failures():
+    service = make_service()
+    email_content = {
+        "id": "m1",
+        "attachments": [
+            {"attachment_id": "a1", "filename": "bill.pdf", "mime_type": "application/pdf"},
+            {"attachment_id": "a2", "filename": "invite.ics", "mime_type": "text/calendar"},
+            {"attachment_id": "a3", "filename": "receipt.png", "mime_type": "image/png"},
+            {"attachment_id": "a4", "filename": "scan.jpg", "mime_type": "image/jpeg"},
+        ],
+    }
+
+    async def download(message_id, attachment_id, inline_data=None):
+        if attachment_id == "a3":
+            raise OSError("connection reset")
+        return attachment_id.encode()
+
+    service.email_client.download_attachment_async = AsyncMock(side_effect=download)
+    service._process_attachment_file = AsyncMock(
+        side_effect=lambda data, filename, mime_type: {"filename": filename}
+    )
+
+    results = await service.process_email_attachments(email_content)
+
+    downloaded = [c.args[1] for c in service.email_client.download_attachment_async.await_args_list]
+    assert sorted(downloaded) == ["a1", "a3", "a4"]
+    assert results == [{"filename": "bill.pdf"}, {"filename": "scan.jpg"}]
+
+
+def test_processed_email_store_round_trips_results_per_account(tmp_path, monkeypatch):
+    monkeypatch.setattr(service_module, "_SQLITE_LOOKUP_CHUNK", 2)
+    store = ProcessedEmailStore(tmp_path / "cache" / "processed.db")
+    assert not (tmp_path / "cache").exists()
+
+    store.record("primary", {"m1": {"amount": 100}, "m2": None, "m3": {"amount": 5}})
+
+    assert store.lookup("primary", ["m1", "m2", "m3", "m4", "m1"]) == {
+        "m1": {"amount": 100}, "m2": None, "m3": {"amount": 5}
+    }
+    assert store.lookup("secondary", ["m1"]) == {}
+
+
+async def test_process_messages_skips_known_emails_and_retries_failures(tmp_path):
+    service = make_service()
+    service.processed_emails = ProcessedEmailStore(tmp_path / "processed.db")
+    service.processed_emails.record("primary", {"m1": {"amount": 100}})
+    service.email_client.get_email_contents_async = AsyncMock(
+        side_effect=lambda ids: {mid: {"id": mid, "subject": mid} for mid in ids}
+    )
+    async def parse(email_data):
+        if email_data["subject"] == "m2":
+            raise RuntimeError("LLM timed out")
+        return None
+
+    service.llm_parser.extract_expense_from_email = AsyncMock(side_effect=parse)
+    messages = [{"id": "m1"}, {"id": "m2"}, {"id": "m3"}]
+
+    first = await service._process_messages(messages)
+
+    service.email_client.get_email_contents_async.assert_awaited_once_with(["m2", "m3"])
+    assert first[0] == {"amount": 100} and isinstance(first[1], RuntimeError) and first[2] is None
+    # The parser failure is not remembered as "no expense"
+    assert service.processed_emails.lookup("primary", ["m2", "m3"]) == {"m3": None}
+
+    service.llm_parser.extract_expense_from_email = AsyncMock(return_value=None)
+    second = await service._process_messages(messages)
+
+    service.email_client.get_email_contents_async.assert_awaited_with(["m2"])
+    assert second == [{"amount": 100}, None, None]
+
+
+def test_email_statistics_counts_sender_domains_from_headers():
+    service = make_service()
+    service.email_client.list_recent_transaction_emails.return_value = [
+        {"id": "m1", "sender": "HDFC Bank <alerts@hdfcbank.net>"},
+        {"id": "m2", "sender": "alerts@hdfcbank.net"},
+        {"id": "m3", "sender": "Swiggy <noreply@swiggy.in>"},
+        {"id": "m4", "sender": "Mailer Daemon"},
+        {"id": "m5"},
+    ]
+
+    stats = service.get_email_statistics(days_back=14)
+
+    service.email_client.list_recent_transaction_emails.assert_called_once_with(
+        max_results=100, days_back=14, include_headers=True
+    )
+    assert stats == {
+        "total_emails": 5,
+        "sender_statistics": {"hdfcbank.net": 2, "swiggy.in": 1},
+        "period_days": 14,
+    }
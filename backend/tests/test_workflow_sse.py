@@ -11,7 +11,7 @@ from src.services.orchestrator.statement_workflow import StatementWorkflow
 def _patch_workflow_init():
     """Context managers to patch all heavy __init__ dependencies."""
     return [
-        patch("src.services.orchestrator.statement_workflow.EmailClient"),
+        patch("src.services.orchestrator.statement_workflow.get_email_client"),
         patch("src.services.orchestrator.statement_workflow.GoogleCloudStorageService"),
         patch("src.services.orchestrator.statement_workflow.DocumentExtractor"),
         patch("src.services.orchestrator.statement_workflow.TransactionStandardizer"),
@@ -35,8 +35,7 @@ async def test_token_refresh_skips_already_refreshed_account():
     for p in init_patches:
         p.start()
     try:
-        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM, \
-             patch("src.services.orchestrator.statement_workflow.build"):
+        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM:
             mock_creds = MagicMock()
             MockTM.return_value.get_valid_credentials.return_value = mock_creds
 
@@ -63,8 +62,7 @@ async def test_token_refresh_runs_for_new_account_id():
     for p in init_patches:
         p.start()
     try:
-        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM, \
-             patch("src.services.orchestrator.statement_workflow.build"):
+        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM:
             mock_creds = MagicMock()
             MockTM.return_value.get_valid_credentials.return_value = mock_creds
 
@@ -85,7 +83,7 @@ async def test_token_refresh_retries_failed_account_on_next_call():
     """Accounts that fail to refresh must NOT be added to _refreshed_accounts,
     so they are retried on the next call to _refresh_all_tokens."""
     init_patches = [
-        patch("src.services.orchestrator.statement_workflow.EmailClient"),
+        patch("src.services.orchestrator.statement_workflow.get_email_client"),
         patch("src.services.orchestrator.statement_workflow.GoogleCloudStorageService"),
         patch("src.services.orchestrator.statement_workflow.DocumentExtractor"),
         patch("src.services.orchestrator.statement_workflow.TransactionStandardizer"),
@@ -98,8 +96,7 @@ async def test_token_refresh_retries_failed_account_on_next_call():
         p.start()
 
     try:
-        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM, \
-             patch("src.services.orchestrator.statement_workflow.build"):
+        with patch("src.services.orchestrator.statement_workflow.TokenManager") as MockTM:
             # First call: credentials returns None (failure)
             MockTM.return_value.get_valid_credentials.return_value = None
 
@@ -223,3 +220,25 @@ def test_workflow_complete_message_mentions_review_queue():
 
     assert "review" in msg.lower()
     assert "3" in msg   # review_queue_total == 3
+
+
+@pytest.mark.asyncio
+async def test_account_nickname_looked_up_once_per_sender_per_run():
+    """Repeated statement steps for one sender share a single nickname query."""
+    init_patches = _patch_workflow_init()
+    for p in init_patches:
+        p.start()
+    try:
+        with patch(
+            "src.services.orchestrator.statement_workflow.AccountOperations.get_account_nickname_by_sender",
+            new=AsyncMock(side_effect=lambda sender: "HDFC Millennia" if "hdfc" in sender else None),
+        ) as mock_lookup:
+            workflow = StatementWorkflow(account_ids=["primary"])
+            for _ in range(3):
+                assert await workflow._get_account_nickname("alerts@hdfcbank.net") == "HDFC Millennia"
+                assert await workflow._get_account_nickname("unknown@bank.com") is None
+
+            assert mock_lookup.await_count == 2
+    finally:
+        for p in init_patches:
+            p.stop()